@@ -6,5 +6,8 @@ pgrep -f "next-server" >/dev/null || { echo "Web UI is down"; exit 1; }
 # 2. Check if Python scheduler is running
 pgrep -f "python3 ./python/src/main.py" >/dev/null || { echo "Python service is down"; exit 1; }
 
-# 3. Check if HTTP endpoint is alive
+# 3. Check if the scheduler serves its metrics (METRICS_PORT=0 disables them)
+[ "${METRICS_PORT:-9464}" = "0" ] || curl -fs http://localhost:${METRICS_PORT:-9464}/metrics >/dev/null || { echo "Scheduler metrics endpoint is down"; exit 1; }
+
+# 4. Check if HTTP endpoint is alive
 curl -fs http://localhost:${WEB_UI_PORT:-8080}/api/health || { echo "Web UI health check failed"; exit 1; }
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: src/point.Point vs influxdb_client_3.Point
+
+Builds and serializes a deco-like batch (one point per client, long tag
+sets, up to ten fields) with both implementations and reports encode time
+and allocations per point.
+
+    python bench_point.py [clients] [rounds]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from influxdb_client_3 import Point as ClientPoint  # noqa: E402
+from point import Point  # noqa: E402
+
+
+def build(point_cls, clients):
+    points = []
+    for i in range(clients):
+        points.append(point_cls("deco_device")
+                      .tag("hostname", f"Guest phone {i % 40}")
+                      .tag("mac_address", f"aa:bb:cc:dd:ee:{i % 40:02x}")
+                      .tag("connection_type", "wireless")
+                      .tag("band", "5G")
+                      .field("ip_address", f"192.168.68.{i % 250}")
+                      .field("online", 1)
+                      .field("signal_strength", -40 - i % 30)
+                      .field("packets_sent", 1000 + i)
+                      .field("packets_received", 2000 + i)
+                      .field("down_speed", 12.5 + i)
+                      .field("up_speed", 3.25 + i)
+                      .time(1700000000 + i))
+    return [p.to_line_protocol(precision='s') for p in points]
+
+
+def measure(point_cls, clients, rounds):
+    build(point_cls, clients)  # warm caches and imports
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        build(point_cls, clients)
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    build(point_cls, clients)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds / (rounds * clients), peak / clients
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    assert build(ClientPoint, clients) == build(Point, clients), "line protocol differs"
+
+    results = {}
+    for name, cls in (("influxdb_client_3.Point", ClientPoint), ("point.Point", Point)):
+        per_point, peak_per_point = measure(cls, clients, rounds)
+        results[name] = per_point
+        print(f"{name:24} {per_point * 1e6:7.2f} us/point  peak {peak_per_point:6.0f} B/point")
+
+    baseline, ours = results.values()
+    print(f"Speedup: {baseline / ours:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,95 @@
-import time
 import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import metrics
+
+CACHE_HITS = metrics.Counter('fetcher_cache_hits_total', 'Cached results returned.', ['cache'])
+CACHE_MISSES = metrics.Counter('fetcher_cache_misses_total', 'Calls that had to compute their result.', ['cache'])
+CACHE_EVICTIONS = metrics.Counter('fetcher_cache_evictions_total',
+                                  'Entries evicted to stay under the size limit.', ['cache'])
+
+
+class _Flight:
+    """A miss being computed; concurrent callers for the same key wait for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
 
 
-def memoize_for_hours(hours):
+def ttl_cache(ttl_seconds: float, maxsize: int = 128, negative_ttl_seconds: float = 60):
+    """Cache results per arguments for `ttl_seconds`, keeping at most `maxsize` (least recently used go first).
+
+    A None result (e.g. a failed login) is only kept for `negative_ttl_seconds`,
+    exceptions are not cached. Concurrent misses on one key run the function
+    once and share its result. The wrapper gets `invalidate(*args, **kwargs)`
+    to drop one entry (e.g. a token after a 401) and `clear()`.
+    """
     def decorator(func):
-        cache = {}
-        seconds = hours * 3600
+        name = f"{func.__module__}.{func.__qualname__}"
+        # key -> (result, expires at), least recently used first
+        entries: 'OrderedDict[Tuple, Tuple[Any, float]]' = OrderedDict()
+        flights: Dict[Tuple, _Flight] = {}
+        lock = threading.Lock()
+
+        def _key(args, kwargs) -> Tuple:
+            return args, tuple(sorted(kwargs.items()))
 
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            key = (args, tuple(sorted(kwargs.items())))
-            current_time = time.time()
-            if key in cache:
-                result, timestamp = cache[key]
-                if current_time - timestamp < seconds:
-                    return result
-            result = func(*args, **kwargs)
-            cache[key] = (result, current_time)
-            return result
+            key = _key(args, kwargs)
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and entry[1] > time.monotonic():
+                    entries.move_to_end(key)
+                    CACHE_HITS.inc(cache=name)
+                    return entry[0]
+                flight = flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = flights[key] = _Flight()
+
+            if not leader:
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                CACHE_HITS.inc(cache=name)
+                return flight.result
+
+            CACHE_MISSES.inc(cache=name)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                flight.error = e
+                raise
+            else:
+                flight.result = result
+                ttl = negative_ttl_seconds if result is None else ttl_seconds
+                with lock:
+                    entries[key] = (result, time.monotonic() + ttl)
+                    entries.move_to_end(key)
+                    while len(entries) > maxsize:
+                        entries.popitem(last=False)
+                        CACHE_EVICTIONS.inc(cache=name)
+                return result
+            finally:
+                with lock:
+                    del flights[key]
+                flight.done.set()
+
+        def invalidate(*args, **kwargs) -> None:
+            with lock:
+                entries.pop(_key(args, kwargs), None)
+
+        def clear() -> None:
+            with lock:
+                entries.clear()
+
+        wrapper.invalidate = invalidate
+        wrapper.clear = clear
         return wrapper
     return decorator
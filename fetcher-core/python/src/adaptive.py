@@ -0,0 +1,97 @@
+import logging
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+import schedule
+
+import metrics
+import scheduler
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# Per-collector bounds override, e.g. "aqualink=30:300,deco=120:900".
+# Setting min == max pins a collector to a fixed interval.
+ADAPTIVE_INTERVALS = os.environ.get('ADAPTIVE_INTERVALS', '')
+
+# Interval multipliers after a run whose values changed / stayed the same.
+SPEED_UP = 0.5
+SLOW_DOWN = 1.5
+
+
+@dataclass
+class AdaptiveJob:
+    job: schedule.Job
+    min_seconds: float
+    max_seconds: float
+    interval: float
+
+
+_jobs: Dict[str, AdaptiveJob] = {}
+
+INTERVAL = metrics.Gauge('fetcher_collector_interval_seconds', 'Current adaptive polling interval.', ['collector'])
+
+
+def _overrides() -> Dict[str, Tuple[float, float]]:
+    out = {}
+    for item in filter(None, (x.strip() for x in ADAPTIVE_INTERVALS.split(','))):
+        try:
+            name, bounds = item.split('=', 1)
+            low, high = bounds.split(':', 1)
+            out[name.strip()] = (float(low), float(high))
+        except ValueError:
+            logger.warning("[adaptive] Ignoring malformed ADAPTIVE_INTERVALS entry %r", item)
+    return out
+
+
+def bounds_for(name: str, default: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    return _overrides().get(name, default)
+
+
+def register(j: schedule.Job, min_seconds: float, max_seconds: float) -> None:
+    """Let the interval of `j` follow how quickly its collector's values change.
+
+    Only plain interval jobs qualify; jobs pinned to a wall-clock time
+    (`.at(...)`) keep their schedule.
+    """
+    name = j.job_func.__name__
+    if j.at_time is not None or j.unit not in ('seconds', 'minutes', 'hours'):
+        logger.warning("[adaptive] %s is not a plain interval job, not adapting it", name)
+        return
+    interval = timedelta(**{j.unit: j.interval}).total_seconds()
+    _jobs[name] = AdaptiveJob(j, min_seconds, max_seconds,
+                              min(max(interval, min_seconds), max_seconds))
+    INTERVAL.set(_jobs[name].interval, collector=name)
+    logger.info("[adaptive] %s adapts between %.0fs and %.0fs", name, min_seconds, max_seconds)
+
+
+def intervals() -> Dict[str, float]:
+    return {name: a.interval for name, a in _jobs.items()}
+
+
+def _on_run(name: str, state: scheduler.JobState) -> None:
+    a = _jobs.get(name)
+    # A run that failed or wrote nothing says nothing about how fast values
+    # change; don't let a broken collector drift towards its slowest interval.
+    if a is None or state.last_status != 'ok' or state.changed is None or state.run_points == 0:
+        return
+
+    factor = SPEED_UP if state.changed else SLOW_DOWN
+    interval = min(max(a.interval * factor, a.min_seconds), a.max_seconds)
+    if interval == a.interval:
+        return
+
+    logger.info("[adaptive] %s values %s, interval %.0fs -> %.0fs",
+                name, 'changed' if state.changed else 'unchanged', a.interval, interval)
+    a.interval = interval
+    INTERVAL.set(interval, collector=name)
+    a.job.interval = int(round(interval))
+    a.job.unit = 'seconds'
+    if a.job.last_run is not None:
+        a.job.next_run = a.job.last_run + timedelta(seconds=a.job.interval)
+    scheduler.snap(a.job)
+
+
+scheduler.add_listener(_on_run)
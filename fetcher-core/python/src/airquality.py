@@ -2,6 +2,8 @@ import logging
 import requests
 import os
 
+import http_pool
+
 from influx import write_influx, Point
 
 # Configure module-specific logger
@@ -33,7 +35,7 @@ def _airquality():
 
     try:
         [lat, lng] = GOOGLE_LAT_LNG.split(',')
-        resp = requests.post(url, json={
+        resp = http_pool.session('airquality').post(url, json={
             "languageCode": "sv",
             "universalAqi": True,
             "location": {
@@ -17,6 +17,7 @@ from iaqualink.const import (
 )
 from iaqualink.exception import AqualinkServiceUnauthorizedException
 
+import sessions
 from influx import write_influx, Point
 
 # Configure module-specific logger
@@ -28,19 +29,30 @@ aqualink_password = os.environ.get('AQUALINK_PASSWORD', '')
 
 timeout = httpx.Timeout(60.0, connect=60.0, read=60.0)
 
-# Persistent async state for session reuse across scheduled invocations
-_loop: asyncio.AbstractEventLoop | None = None
+# Persistent async state for session reuse across scheduled invocations.
+# Bound to the scheduler's long-lived event loop.
 _httpx_client: httpx.AsyncClient | None = None
 _aqualink_client: AqualinkClient | None = None
 _client_created_at: float = 0
 _CLIENT_TTL_SECONDS = 3600  # 1 hour
 
 
-def _get_loop() -> asyncio.AbstractEventLoop:
-    global _loop
-    if _loop is None or _loop.is_closed():
-        _loop = asyncio.new_event_loop()
-    return _loop
+class _StoredSessionClient(AqualinkClient):
+    """AqualinkClient that answers login requests from the session store while its tokens are valid.
+
+    login() and I2DSystem's device requests both go through
+    _send_login_request, so neither logs in again every cycle or restart.
+    """
+
+    async def _send_login_request(self) -> httpx.Response:
+        data = sessions.get('aqualink', aqualink_username)
+        if data is not None:
+            return httpx.Response(200, json=data)
+        r = await super()._send_login_request()
+        data = r.json()
+        expires_in = data.get('userPoolOAuth', {}).get('ExpiresIn', 3600)
+        sessions.put('aqualink', aqualink_username, data, time.time() + expires_in)
+        return r
 
 
 async def _get_client() -> AqualinkClient:
@@ -57,7 +69,7 @@ async def _get_client() -> AqualinkClient:
 
     # Create and login AqualinkClient if needed
     if _aqualink_client is None or not _aqualink_client.logged:
-        _aqualink_client = AqualinkClient(
+        _aqualink_client = _StoredSessionClient(
             aqualink_username, aqualink_password, _httpx_client
         )
         await _aqualink_client.login()
@@ -81,25 +93,25 @@ async def _reset_client() -> None:
     _client_created_at = 0
 
 
-def aqualink():
+async def aqualink():
     if not aqualink_username or not aqualink_password:
         logger.error(
             "[aqualink] AQUALINK_USERNAME or AQUALINK_PASSWORD environment variable not set, ignoring...")
         return
 
-    loop = _get_loop()
     try:
-        loop.run_until_complete(_aqualink())
+        await _aqualink()
     except (httpx.ReadTimeout, httpx.TimeoutException):
-        logger.warning("[aqualink] Aqualink request timed out", exc_info=False)
-        loop.run_until_complete(_reset_client())
+        logger.error("[aqualink] Aqualink request timed out", exc_info=False)
+        await _reset_client()
     except AqualinkServiceUnauthorizedException:
-        logger.warning("[aqualink] Aqualink auth failed, resetting session", exc_info=False)
-        loop.run_until_complete(_reset_client())
+        logger.error("[aqualink] Aqualink auth failed, resetting session", exc_info=False)
+        sessions.drop('aqualink', aqualink_username)
+        await _reset_client()
     except Exception:
-        logger.warning(
+        logger.error(
             "[aqualink] Failed to run aqualink module", exc_info=True)
-        loop.run_until_complete(_reset_client())
+        await _reset_client()
 
 
 async def _aqualink():
@@ -143,7 +155,7 @@ async def _aqualink():
             logger.warning(f"[aqualink] No online devices found after {max_retries} attempts, giving up")
             return
 
-    write_influx(points)
+    await asyncio.to_thread(write_influx, points)
 
 IAQUA_DEVICE_URL = "https://r-api.iaqualink.net/v2/devices/"
 
@@ -161,9 +173,13 @@ class I2DSystem(AqualinkSystem):
 
     async def update(self) -> None:
         resp = await self._send_device_request()
+        if resp.status_code == 401:
+            # The stored IdToken was rejected; aqualink() drops the session.
+            raise AqualinkServiceUnauthorizedException
         data: dict = resp.json()
         if not data or "alldata" not in data:
-            logger.error("[i2d] No alldata found in response")
+            logger.error("[i2d] No alldata found in response, dropping stored session")
+            sessions.drop('aqualink', aqualink_username)
             return
 
         self.devices = {
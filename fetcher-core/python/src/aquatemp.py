@@ -2,12 +2,15 @@ import os
 import requests
 import logging
 import hashlib
+import time
 
 from typing import Dict, List, Optional, Tuple
 from pprint import pformat
+import http_pool
+import sessions
 from influx import write_influx, Point
 
-from _decorators import memoize_for_hours
+from _decorators import ttl_cache
 
 # Configure module-specific logger
 logger = logging.getLogger(__name__)
@@ -34,18 +37,53 @@ PROTOCOL_CODES = list(CODES.keys()) + list(DERIVATION_CODES)
 
 
 def aquatemp():
+    if not cloudurl:
+        logger.error(
+            "[aquatemp] AQUATEMP_BASEURL environment variable not set, ignoring...")
+        return
     try:
         _aquatemp()
     except Exception as e:
         logger.exception(f"[aquatemp] Failed to execute aquatemp module: {e}")
 
 
-cloudurl = os.environ['AQUATEMP_BASEURL']
+cloudurl = os.environ.get('AQUATEMP_BASEURL', '')
+
+
+class AuthError(Exception):
+    """The cloud rejected our token; it has to be fetched again."""
+
+
+def _check_auth(response: requests.Response) -> None:
+    if response.status_code in (401, 403):
+        raise AuthError(f"{response.status_code} {response.text[:200]}")
+
+
+TOKEN_SECONDS = 24 * 3600
 
 
-@memoize_for_hours(24)
+# Tokens are good for a day and kept in the session store across restarts,
+# which decides when to log in again; the in-memory copy is rechecked hourly.
+# A failed login is retried after 5 minutes instead of being remembered.
+@ttl_cache(3600, maxsize=1, negative_ttl_seconds=300)
 def getToken() -> Optional[Tuple[str, str]]:
     username = os.environ['AQUATEMP_USERNAME']
+    stored = sessions.get('aquatemp', username)
+    if stored is not None:
+        return stored['token'], stored['user_id']
+    token_data = _login(username)
+    if token_data:
+        sessions.put('aquatemp', username, {'token': token_data[0], 'user_id': token_data[1]},
+                     time.time() + TOKEN_SECONDS)
+    return token_data
+
+
+def invalidateToken() -> None:
+    getToken.invalidate()
+    sessions.drop('aquatemp', os.environ['AQUATEMP_USERNAME'])
+
+
+def _login(username: str) -> Optional[Tuple[str, str]]:
     password = os.environ['AQUATEMP_PASSWORD']
 
     # Step 1: Get token
@@ -59,7 +97,7 @@ def getToken() -> Optional[Tuple[str, str]]:
     }
 
     logger.info('[aquatemp] Getting new AquaTemp token...')
-    login_response = requests.post(
+    login_response = http_pool.session('aquatemp').post(
         f"{cloudurl}/app/user/login?lang=en", json=login_payload, timeout=30)
 
     if login_response.status_code != 200:
@@ -80,10 +118,11 @@ def getToken() -> Optional[Tuple[str, str]]:
 
 def getDevices(token: str, user_id: str) -> List[Dict[str, str]]:
     headers = {"x-token": token}
-    devices_response = requests.post(
+    devices_response = http_pool.session('aquatemp').post(
         f"{cloudurl}/app/device/deviceList?lang=en", headers=headers, json={
             'appId': '14',
         }, timeout=30)
+    _check_auth(devices_response)
     if devices_response.status_code != 200:
         logger.error(
             f"[aquatemp] Failed to fetch device list: {devices_response.text}")
@@ -91,11 +130,12 @@ def getDevices(token: str, user_id: str) -> List[Dict[str, str]]:
     devices_response = devices_response.json().get('objectResult', [])
     logger.info(f"[aquatemp] Found {len(devices_response)} devices")
 
-    devices_response_share = requests.post(
+    devices_response_share = http_pool.session('aquatemp').post(
         f"{cloudurl}/app/device/getMyAppectDeviceShareDataList?lang=en", headers=headers, json={
             'appId': '14',
             'toUser': user_id
         }, timeout=30)
+    _check_auth(devices_response_share)
     if devices_response_share.status_code != 200:
         logger.error(
             f"[aquatemp] Failed to fetch shared devices: {devices_response_share.text}")
@@ -110,12 +150,13 @@ def getDevices(token: str, user_id: str) -> List[Dict[str, str]]:
 
 def getDeviceData(token: str, deviceCode: str) -> Optional[list[Dict[str, str]]]:
     headers = {"x-token": token}
-    deviceData_response = requests.post(
+    deviceData_response = http_pool.session('aquatemp').post(
         f"{cloudurl}/app/device/getDataByCode?lang=en", headers=headers, json={
             'deviceCode': deviceCode,
             'protocalCodes': PROTOCOL_CODES,
             'appId': '14',
         }, timeout=30)
+    _check_auth(deviceData_response)
     if deviceData_response.status_code != 200:
         logger.error(
             f"[aquatemp] Failed to fetch device data: {deviceData_response.text}")
@@ -125,6 +166,16 @@ def getDeviceData(token: str, deviceCode: str) -> Optional[list[Dict[str, str]]]
 
 
 def _aquatemp():
+    try:
+        _collect()
+    except AuthError as e:
+        # Revoked or expired early: log in again once.
+        logger.warning(f"[aquatemp] Token rejected ({e}), logging in again")
+        invalidateToken()
+        _collect()
+
+
+def _collect():
     token_data = getToken()
     if not token_data:
         logger.error(
@@ -54,13 +54,13 @@ def get_desired_heat_mode() -> HeatMode:
     return HOURLY_HEAT_MODE_SCHEDULE[now.hour]
 
 
-def balboa():
+async def balboa():
     if not spa_ip:
         logger.error(
             "[balboa] BALBOA_HOST environment variable not set, ignoring...")
         return
     try:
-        asyncio.run(_balboa())
+        await _balboa()
     except KeyboardInterrupt:
         pass
     except pybalboa.exceptions.SpaConnectionError:
@@ -120,10 +120,10 @@ async def _balboa():
         logger.info("[balboa] Disconnecting from spa")
         await spa.disconnect()
 
-        write_influx([p for p in [temp, heat, circ] if p is not None])
+        await asyncio.to_thread(write_influx, [p for p in [temp, heat, circ] if p is not None])
 
 
-def balboa_control():
+async def balboa_control():
     """Hourly task to control spa heat mode based on energy price peak hours."""
     if not spa_ip:
         logger.error(
@@ -131,7 +131,7 @@ def balboa_control():
         return
 
     try:
-        asyncio.run(_balboa_control())
+        await _balboa_control()
     except KeyboardInterrupt:
         pass
     except pybalboa.exceptions.SpaConnectionError:
@@ -219,7 +219,7 @@ async def _balboa_control():
                     .field("changed", True) \
                     .field("previous_mode", int(current_mode)) \
                     .field("hour", current_time.hour)
-                write_influx([control_point])
+                await asyncio.to_thread(write_influx, [control_point])
             else:
                 logger.error(
                     f"[balboa_control] Failed to change heat mode to {desired_name}")
@@ -0,0 +1,210 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import lineprotocol
+import metrics
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# Per-measurement series limits, e.g. "deco_device=200:hostname|mac_address,tapo_device=50".
+# Once a measurement has that many active series, new series get the listed
+# tags (default: its highest-cardinality tag) folded to CARDINALITY_FOLD_VALUE,
+# or removed with CARDINALITY_ACTION=drop.
+CARDINALITY_LIMITS = os.environ.get('CARDINALITY_LIMITS', '')
+CARDINALITY_ACTION = os.environ.get('CARDINALITY_ACTION', 'fold')
+CARDINALITY_FOLD_VALUE = os.environ.get('CARDINALITY_FOLD_VALUE', 'other')
+
+# Series not seen for this long stop counting as active, and the window over
+# which churn (series not seen in the previous window) is reported.
+CARDINALITY_WINDOW_SECONDS = float(os.environ.get('CARDINALITY_WINDOW_SECONDS', '3600'))
+
+# How often the estimates are pushed to the metric gauges.
+REPORT_SECONDS = 60
+# Folded series logged per measurement and window, the rest are only counted.
+LOG_SAMPLE = 5
+
+SERIES = metrics.Gauge('fetcher_series_estimate', 'Distinct series written since start (HyperLogLog).', ['measurement'])
+ACTIVE = metrics.Gauge('fetcher_series_active_estimate', 'Distinct series in the current window.', ['measurement'])
+CHURN = metrics.Gauge('fetcher_series_churn_estimate',
+                      'Series in the current window that were not in the previous one.', ['measurement'])
+TAG_VALUES = metrics.Gauge('fetcher_tag_values_estimate', 'Distinct values per tag since start.', ['measurement', 'tag'])
+FOLDED = metrics.Counter('fetcher_series_folded_points_total',
+                         'Points whose tags were folded or dropped by a cardinality limit.', ['measurement'])
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Distinct count estimate in 2**p bytes, about 1.04 / sqrt(2**p) relative error."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        h = _hash(value)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def union(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        out = HyperLogLog(self.p)
+        out.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return out
+
+    def count(self) -> float:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small range correction (linear counting).
+            estimate = self.m * math.log(self.m / zeros)
+        return estimate
+
+
+class _Limit:
+    def __init__(self, series: int, tags: Tuple[str, ...]):
+        self.series = series
+        self.tags = tags
+        # Admitted series -> last seen; series idle for a window are forgotten.
+        self.admitted: 'OrderedDict[str, float]' = OrderedDict()
+        self.logged = 0
+        # Highest-cardinality tag when none are configured, picked once per window.
+        self.auto_tags: Optional[Tuple[str, ...]] = None
+
+
+class _Measurement:
+    def __init__(self):
+        self.total = HyperLogLog()
+        self.current = HyperLogLog()
+        self.previous = HyperLogLog()
+        self.tags: Dict[str, HyperLogLog] = {}
+
+
+def _parse_limits() -> Dict[str, _Limit]:
+    limits = {}
+    for item in filter(None, (x.strip() for x in CARDINALITY_LIMITS.split(','))):
+        try:
+            name, spec = item.split('=', 1)
+            count, _, tags = spec.partition(':')
+            limits[name.strip()] = _Limit(int(count), tuple(t for t in tags.split('|') if t))
+        except ValueError:
+            logger.warning("[cardinality] Ignoring malformed CARDINALITY_LIMITS entry %r", item)
+    return limits
+
+
+_limits = _parse_limits()
+_measurements: Dict[str, _Measurement] = {}
+_lock = threading.Lock()
+_window_started = time.monotonic()
+_reported = 0.0
+
+
+def _rotate(now: float) -> None:
+    global _window_started
+    if now - _window_started < CARDINALITY_WINDOW_SECONDS:
+        return
+    _window_started = now
+    for m in _measurements.values():
+        m.previous, m.current = m.current, HyperLogLog()
+    for limit in _limits.values():
+        limit.logged = 0
+        limit.auto_tags = None
+
+
+def _report() -> None:
+    for name, m in _measurements.items():
+        SERIES.set(round(m.total.count()), measurement=name)
+        active = m.current.count()
+        ACTIVE.set(round(active), measurement=name)
+        CHURN.set(max(0, round(m.current.union(m.previous).count() - m.previous.count())), measurement=name)
+        for tag, hll in m.tags.items():
+            TAG_VALUES.set(round(hll.count()), measurement=name, tag=tag)
+
+
+def _offending(m: _Measurement, limit: _Limit) -> Tuple[str, ...]:
+    if limit.tags:
+        return limit.tags
+    if limit.auto_tags is None:
+        limit.auto_tags = (max(m.tags, key=lambda t: m.tags[t].count()),) if m.tags else ()
+    return limit.auto_tags
+
+
+def _admit(name: str, series: str, tags: List[Tuple[str, str]], measurement: str,
+           m: _Measurement, limit: _Limit, now: float) -> Optional[str]:
+    """The series key to write under: unchanged while within the limit, folded beyond it."""
+    admitted = limit.admitted
+    while admitted:
+        _, seen = next(iter(admitted.items()))
+        if now - seen < CARDINALITY_WINDOW_SECONDS:
+            break
+        admitted.popitem(last=False)
+
+    if series in admitted or len(admitted) < limit.series:
+        admitted[series] = now
+        admitted.move_to_end(series)
+        return None
+
+    offending = _offending(m, limit)
+    if CARDINALITY_ACTION == 'drop':
+        folded_tags = [(k, v) for k, v in tags if lineprotocol.unescape(k) not in offending]
+    else:
+        folded_tags = [(k, CARDINALITY_FOLD_VALUE if lineprotocol.unescape(k) in offending else v)
+                       for k, v in tags]
+    FOLDED.inc(measurement=name)
+    if limit.logged < LOG_SAMPLE:
+        limit.logged += 1
+        logger.warning("[cardinality] %s is over its limit of %d series, %s %s of %s",
+                       name, limit.series, 'dropping' if CARDINALITY_ACTION == 'drop' else 'folding',
+                       ', '.join(offending), lineprotocol.unescape(series))
+    return lineprotocol.join_series(measurement, folded_tags)
+
+
+def guard(lines: List[str]) -> List[str]:
+    """Track series per measurement and fold new series of measurements over their limit."""
+    global _reported
+    now = time.monotonic()
+    out = []
+    with _lock:
+        _rotate(now)
+        for line in lines:
+            parsed = lineprotocol.split(line)
+            if parsed is None:
+                out.append(line)
+                continue
+            series = parsed[0]
+            measurement, tags = lineprotocol.split_series(series)
+            name = lineprotocol.unescape(measurement)
+            m = _measurements.get(name)
+            if m is None:
+                m = _measurements[name] = _Measurement()
+
+            m.total.add(series)
+            m.current.add(series)
+            for k, v in tags:
+                key = lineprotocol.unescape(k)
+                tag = m.tags.get(key)
+                if tag is None:
+                    tag = m.tags[key] = HyperLogLog(p=10)
+                tag.add(v)
+
+            limit = _limits.get(name)
+            folded = _admit(name, series, tags, measurement, m, limit, now) if limit else None
+            out.append(line if folded is None else folded + line[len(series):])
+
+        if now - _reported >= REPORT_SECONDS:
+            _reported = now
+            _report()
+    return out
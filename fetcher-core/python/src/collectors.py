@@ -0,0 +1,175 @@
+import importlib
+import logging
+import os
+import resource
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import schedule
+
+from scheduler import JobFunc
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Collector:
+    """One integration: where its entry point lives and when it runs.
+
+    The module is only imported by `load()`, so integrations that are not
+    configured (or not asked for on the command line) never pay for their
+    vendor libraries.
+    """
+    name: str
+    module: str
+    schedules: Tuple[Callable[[], schedule.Job], ...] = ()
+    required_env: Tuple[str, ...] = ()
+    timeout_seconds: float = 120
+    lane: str = 'default'
+    # Run at startup when the scheduler has no persisted history of the job.
+    warm_start: bool = True
+    entry: Optional[str] = None
+    # Collectors sharing in-memory state must share a worker process when
+    # running with COLLECTOR_ISOLATION=process. Defaults to the name.
+    group: Optional[str] = None
+    # (min, max) seconds: the interval shrinks while values change and grows
+    # while they stay flat. Overridable via ADAPTIVE_INTERVALS.
+    adaptive: Optional[Tuple[float, float]] = None
+
+    @property
+    def entry_point(self) -> str:
+        return self.entry or self.name
+
+
+COLLECTORS: List[Collector] = [
+    Collector('aqualink', 'aqualink',
+              schedules=(lambda: schedule.every(1).minutes,),
+              required_env=('AQUALINK_USERNAME', 'AQUALINK_PASSWORD'),
+              adaptive=(30, 300)),
+    Collector('ngenic', 'ngenic',
+              schedules=(lambda: schedule.every(5).minutes,),
+              required_env=('NGENIC_TOKEN',)),
+    # sigenergy now handled by the sigenergy-bridge Go service
+    # balboa / balboa_control disabled - now handled by Home Assistant
+    Collector('aquatemp', 'aquatemp',
+              schedules=(lambda: schedule.every(5).minutes,),
+              required_env=('AQUATEMP_BASEURL', 'AQUATEMP_USERNAME', 'AQUATEMP_PASSWORD')),
+    Collector('deco', 'deco',
+              schedules=(lambda: schedule.every(5).minutes,),
+              required_env=('DECO_PASSWORD',)),
+    Collector('tapo', 'tapo',
+              schedules=(lambda: schedule.every(5).minutes,),
+              required_env=('TAPO_EMAIL', 'TAPO_PASSWORD')),
+    Collector('eufy', 'eufy',
+              schedules=(lambda: schedule.every(5).minutes,),
+              required_env=('EUFY_USERNAME', 'EUFY_PASSWORD')),
+    Collector('sonos', 'sonos',
+              schedules=(lambda: schedule.every(1).minutes,),
+              required_env=('SONOS_HOST',),
+              adaptive=(30, 300)),
+    # Primary: run right before the pool-pump-planner fires at 14:15 local,
+    # so day-ahead prices are fresh. Backup every 6h in case the primary is
+    # missed (container down, job slip, etc.).
+    Collector('elpris', 'elpris',
+              schedules=(lambda: schedule.every().day.at('14:03'),
+                         lambda: schedule.every(6).hours),
+              lane='heavy'),
+    Collector('airquality', 'airquality',
+              schedules=(lambda: schedule.every(1).hours.at(':05'),),
+              required_env=('GOOGLE_API_KEY', 'GOOGLE_LAT_LNG')),
+    Collector('eufy_snapshot', 'eufy',
+              schedules=(lambda: schedule.every(3).hours.at(':15'),),
+              required_env=('EUFY_USERNAME', 'EUFY_PASSWORD'),
+              lane='heavy', group='eufy'),
+    # Avoid this from running every startup. Once it has run, restarts
+    # resume its 12h cadence from the persisted state instead.
+    Collector('backup_vm', 'backup_vm',
+              schedules=(lambda: schedule.every(12).hours.at(':10'),),
+              required_env=('INFLUX_HOST', 'GOOGLE_BACKUP_URI', 'GOOGLE_SERVICE_ACCOUNT'),
+              timeout_seconds=3600, lane='heavy', warm_start=False),
+]
+
+
+@dataclass
+class ImportStats:
+    module: str
+    seconds: float
+    rss_bytes: int
+
+
+_loaded: Dict[str, JobFunc] = {}
+_imports: Dict[str, ImportStats] = {}
+
+
+def get(name: str) -> Optional[Collector]:
+    return next((c for c in COLLECTORS if c.name == name), None)
+
+
+def names() -> List[str]:
+    return [c.name for c in COLLECTORS]
+
+
+def missing_env(collector: Collector) -> List[str]:
+    return [key for key in collector.required_env if not os.environ.get(key)]
+
+
+def configured() -> List[Collector]:
+    """Collectors whose required environment is set. The rest are logged and skipped."""
+    out = []
+    for c in COLLECTORS:
+        missing = missing_env(c)
+        if missing:
+            logger.info("[collectors] %s not configured (missing %s), skipping",
+                        c.name, ', '.join(missing))
+            continue
+        out.append(c)
+    return out
+
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is a high-water mark in KiB, good enough for deltas.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def load(collector: Collector) -> JobFunc:
+    """Import the collector's module on first use and return its entry point."""
+    func = _loaded.get(collector.name)
+    if func is not None:
+        return func
+
+    if collector.module not in _imports:
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        importlib.import_module(collector.module)
+        _imports[collector.module] = ImportStats(
+            module=collector.module,
+            seconds=time.perf_counter() - started,
+            rss_bytes=_rss_bytes() - rss_before,
+        )
+
+    func = getattr(importlib.import_module(collector.module), collector.entry_point)
+    _loaded[collector.name] = func
+    return func
+
+
+def log_import_report() -> None:
+    """Log import time and RSS growth per collector module.
+
+    Shared dependencies (influx, requests, ...) are charged to whichever
+    module imported them first.
+    """
+    total_seconds = 0.0
+    total_rss = 0
+    for stats in sorted(_imports.values(), key=lambda s: s.seconds, reverse=True):
+        logger.info("[collectors] Imported %s in %.2fs (+%.1f MB RSS)",
+                    stats.module, stats.seconds, stats.rss_bytes / 1e6)
+        total_seconds += stats.seconds
+        total_rss += stats.rss_bytes
+    logger.info("[collectors] Imported %d modules in %.2fs (+%.1f MB RSS), process RSS %.1f MB",
+                len(_imports), total_seconds, total_rss / 1e6, _rss_bytes() / 1e6)
@@ -1,6 +1,7 @@
 import os
 import logging
-from typing import List
+import time
+from typing import List, Optional
 
 from tplinkrouterc6u import TPLinkDecoClient, Connection
 from influx import write_influx, Point
@@ -11,6 +12,14 @@ logger = logging.getLogger(__name__)
 deco_ip = os.environ.get('DECO_IP', 'http://192.168.68.1')
 deco_password = os.environ.get('DECO_PASSWORD', '')
 
+# The router session is kept between runs instead of authorizing and logging
+# out every cycle, and renewed after this long or when a request fails. It
+# lives in the library's client object, so it is not persisted across restarts.
+DECO_SESSION_SECONDS = 3600
+
+_router: Optional[TPLinkDecoClient] = None
+_authorized_at = 0.0
+
 
 def deco():
     if not deco_password:
@@ -22,15 +31,36 @@ def deco():
         logger.exception(f"[deco] Failed to execute deco module: {e}")
 
 
+def _router_client() -> TPLinkDecoClient:
+    global _router, _authorized_at
+    if _router is not None and time.monotonic() - _authorized_at > DECO_SESSION_SECONDS:
+        _reset_router()
+    if _router is None:
+        router = TPLinkDecoClient(deco_ip, deco_password)
+        router.authorize()
+        _router, _authorized_at = router, time.monotonic()
+    return _router
+
+
+def _reset_router() -> None:
+    global _router
+    if _router is not None:
+        try:
+            _router.logout()
+        except Exception:
+            pass
+    _router = None
+
+
 def _deco():
     logger.info("[deco] Fetching device data from %s", deco_ip)
 
-    router = TPLinkDecoClient(deco_ip, deco_password)
     try:
-        router.authorize()
-        status = router.get_status()
-    finally:
-        router.logout()
+        status = _router_client().get_status()
+    except Exception as e:
+        logger.info("[deco] Request failed (%s), authorizing again", e)
+        _reset_router()
+        status = _router_client().get_status()
 
     logger.info(
         "[deco] Router: %d wired, %d wifi, %d total clients",
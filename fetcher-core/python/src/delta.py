@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import lineprotocol
+import metrics
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# Fields whose value did not change since the last write of their series are
+# dropped, but every field is still written at least every
+# DELTA_HEARTBEAT_RUNS polls of its series, and at least every
+# DELTA_HEARTBEAT_SECONDS, so "last value" and staleness queries keep working.
+# The heartbeat follows each collector's own cadence: a field polled every
+# minute is rewritten every 3 minutes, one polled every 5 minutes every 15.
+# Staleness queries need a lookback of at least the heartbeat (e.g.
+# last_over_time(...[15m])). DELTA_HEARTBEAT_RUNS=1 or
+# DELTA_HEARTBEAT_SECONDS=0 disables suppression.
+DELTA_HEARTBEAT_RUNS = int(os.environ.get('DELTA_HEARTBEAT_RUNS', '3'))
+DELTA_HEARTBEAT_SECONDS = float(os.environ.get('DELTA_HEARTBEAT_SECONDS', '900'))
+# Measurements that are always written in full, e.g. "sonos_playback,energy_price".
+DELTA_EXCLUDE = {m.strip() for m in os.environ.get('DELTA_EXCLUDE', '').split(',') if m.strip()}
+
+# Series remembered at most; the cache starts over (one full write) beyond it.
+MAX_SERIES = 50000
+
+FIELDS = metrics.Counter('fetcher_delta_fields_total', 'Fields offered to the write path.', ['measurement'])
+SUPPRESSED = metrics.Counter('fetcher_delta_fields_suppressed_total',
+                             'Unchanged fields dropped before writing.', ['measurement'])
+
+# series -> field -> (raw value, monotonic time it was last written, polls suppressed since)
+_last: Dict[str, Dict[str, Tuple[str, float, int]]] = {}
+_lock = threading.Lock()
+
+
+def _enabled() -> bool:
+    return DELTA_HEARTBEAT_RUNS > 1 and DELTA_HEARTBEAT_SECONDS > 0
+
+
+def suppress(lines: List[str]) -> List[str]:
+    """Drop fields that did not change since their last write, unless their heartbeat is due.
+
+    Only lines without an explicit timestamp are considered: timestamped
+    points (price curves, forecasts) are distinct samples, not repeated polls.
+    """
+    if not _enabled():
+        return lines
+
+    now = time.monotonic()
+    out = []
+    with _lock:
+        if len(_last) > MAX_SERIES:
+            logger.info("[delta] More than %d series cached, starting over", MAX_SERIES)
+            _last.clear()
+        for line in lines:
+            parsed = lineprotocol.split(line)
+            if parsed is None or parsed[2]:
+                out.append(line)
+                continue
+            series, fields, _ = parsed
+            measurement = lineprotocol.unescape(lineprotocol.split_series(series)[0])
+            if measurement in DELTA_EXCLUDE:
+                out.append(line)
+                continue
+
+            seen = _last.setdefault(series, {})
+            kept = []
+            for key, value in fields:
+                last = seen.get(key)
+                if (last is not None and last[0] == value and last[2] < DELTA_HEARTBEAT_RUNS - 1
+                        and now - last[1] < DELTA_HEARTBEAT_SECONDS):
+                    seen[key] = (value, last[1], last[2] + 1)
+                    continue
+                seen[key] = (value, now, 0)
+                kept.append(f"{key}={value}")
+
+            FIELDS.inc(len(fields), measurement=measurement)
+            if len(kept) < len(fields):
+                SUPPRESSED.inc(len(fields) - len(kept), measurement=measurement)
+            if kept:
+                out.append(f"{series} {','.join(kept)}")
+    return out
+
+
+def forget(lines: List[str]) -> None:
+    """Forget the values of `lines` after a sink failed to store them, so they are written again next time."""
+    if not _enabled():
+        return
+
+    with _lock:
+        for line in lines:
+            parsed = lineprotocol.split(line)
+            if parsed is None:
+                continue
+            seen = _last.get(parsed[0])
+            if seen is not None:
+                for key, _ in parsed[1]:
+                    seen.pop(key, None)
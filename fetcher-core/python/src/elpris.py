@@ -1,14 +1,38 @@
+import json
 import logging
-from typing import Dict, List, TypedDict
-from datetime import datetime, timedelta
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple, TypedDict
+from datetime import date, datetime, timedelta
+
 import requests
 
-from influx import write_influx, Point
+import http_pool
+
+from influx import write_influx_confirmed, Point
+from scheduler import FETCHER_STATE_DIR
 
 # Configure module-specific logger
 logger = logging.getLogger(__name__)
 
-areas = ["SE4"]
+# Price areas to fetch, e.g. "SE3,SE4".
+areas = [a.strip() for a in os.environ.get('ELPRIS_AREAS', 'SE4').split(',') if a.strip()]
+
+BASE_URL = 'https://www.elprisetjustnu.se/api/v1/prices'
+
+# Days of history kept up to date. Published day-ahead prices never change,
+# so days every sink confirmed storing are recorded in ELPRIS_INDEX_FILE and
+# not fetched again; only missing days and the not yet published tomorrow are.
+# ELPRIS_FULL_SWEEP=1 refetches the whole window, e.g.
+#   docker exec -e ELPRIS_FULL_SWEEP=1 iot-fetcher python python/src/main.py elpris
+ELPRIS_DAYS = int(os.environ.get('ELPRIS_DAYS', '30'))
+ELPRIS_INDEX_FILE = os.environ.get('ELPRIS_INDEX_FILE', os.path.join(FETCHER_STATE_DIR, 'elpris.json'))
+ELPRIS_FULL_SWEEP = os.environ.get('ELPRIS_FULL_SWEEP', '') == '1'
+
+# All area/day files of a run are downloaded concurrently by this many
+# threads. The ETag / Last-Modified of written days are kept in the index,
+# so a full sweep re-downloads nothing that did not change.
+ELPRIS_WORKERS = int(os.environ.get('ELPRIS_WORKERS', '4'))
 
 
 class EnergyData(TypedDict):
@@ -19,13 +43,63 @@ class EnergyData(TypedDict):
     time_end: str
 
 
-def get_elpris_price_url(area: str, day_offset: int):
-    now = datetime.now() + timedelta(days=day_offset)
-    yyyy = now.strftime("%Y")
-    mm = now.strftime("%m")
-    dd = (now + timedelta(days=1 if now.hour >= 12 else 0)).strftime("%d")
-    baseUrl = 'https://www.elprisetjustnu.se/api/v1/prices'
-    return f"{baseUrl}/{yyyy}/{mm}-{dd}_{area}.json"
+def get_elpris_price_url(area: str, day: date) -> str:
+    return f"{BASE_URL}/{day:%Y}/{day:%m-%d}_{area}.json"
+
+
+def _window(today: date) -> List[date]:
+    """The last ELPRIS_DAYS days, today and tomorrow (published around 13:00)."""
+    return [today + timedelta(days=i) for i in range(-ELPRIS_DAYS, 2)]
+
+
+class _Index:
+    """Days already fetched and written per area, and the validators of their files."""
+
+    def __init__(self, settled: Dict[str, Set[str]], validators: Dict[str, Dict[str, str]]):
+        self.settled = settled
+        self.validators = validators
+
+
+def _load_index() -> _Index:
+    try:
+        with open(ELPRIS_INDEX_FILE) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return _Index({}, {})
+    except (OSError, ValueError) as e:
+        logger.warning("[elpris] Ignoring unreadable index %s: %s", ELPRIS_INDEX_FILE, e)
+        return _Index({}, {})
+    if 'settled' not in saved:
+        # Written before validators were kept: {area: [days]}.
+        saved = {'settled': saved}
+    return _Index({area: set(days) for area, days in saved['settled'].items()},
+                  saved.get('validators', {}))
+
+
+def _save_index(index: _Index) -> None:
+    try:
+        os.makedirs(os.path.dirname(ELPRIS_INDEX_FILE), exist_ok=True)
+        tmp = f"{ELPRIS_INDEX_FILE}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'settled': {area: sorted(days) for area, days in index.settled.items()},
+                       'validators': index.validators}, f)
+        os.replace(tmp, ELPRIS_INDEX_FILE)
+    except OSError as e:
+        logger.warning("[elpris] Unable to save index %s: %s", ELPRIS_INDEX_FILE, e)
+
+
+def _fetch(url: str, known: Optional[Dict[str, str]]) -> Tuple[int, Optional[List[Dict[str, str]]], Dict[str, str]]:
+    """(status, prices, validators) of one day file, conditional on `known` validators."""
+    headers = {}
+    if known:
+        if 'etag' in known:
+            headers['If-None-Match'] = known['etag']
+        if 'last_modified' in known:
+            headers['If-Modified-Since'] = known['last_modified']
+    resp = http_pool.session('elpris').get(url, headers=headers, timeout=15)
+    validators = {key: resp.headers[header] for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified'))
+                  if header in resp.headers}
+    return resp.status_code, resp.json() if resp.status_code == 200 else None, validators
 
 
 def elpris():
@@ -38,26 +112,66 @@ def elpris():
 def _elpris():
     logger.info("[elpris] Fetching energy prices from Elpriset justnu...")
 
+    window = _window(datetime.now().date())
+    oldest = window[0].isoformat()
+    index = _load_index()
+
+    wanted: List[Tuple[str, date, str]] = []
     for area in areas:
-        for i in range(-30, 1):
-            url = get_elpris_price_url(area=area, day_offset=i)
-            logger.info(f"[elpris] Fetching energy prices from {url}...")
-            resp = requests.get(url, timeout=15)
-
-            if (resp.status_code != 200):
-                logger.info(
-                    "[elpris] Error when fetching energy prices: " + str(resp))
+        # Forget days that fell out of the window.
+        settled = {d for d in index.settled.get(area, set()) if d >= oldest}
+        index.settled[area] = settled
+        days = window if ELPRIS_FULL_SWEEP else [d for d in window if d.isoformat() not in settled]
+        logger.info("[elpris] %s: fetching %d of %d days", area, len(days), len(window))
+        wanted.extend((area, day, get_elpris_price_url(area, day)) for day in days)
+    in_window = {get_elpris_price_url(area, day) for area in areas for day in window}
+    index.validators = {url: v for url, v in index.validators.items() if url in in_window}
+
+    points: List[Point] = []
+    written: List[Tuple[str, date, str, Dict[str, str]]] = []
+    with ThreadPoolExecutor(max_workers=ELPRIS_WORKERS, thread_name_prefix='elpris') as pool:
+        futures = {pool.submit(_fetch, url, index.validators.get(url)): (area, day, url)
+                   for area, day, url in wanted}
+        for future in as_completed(futures):
+            area, day, url = futures[future]
+            try:
+                status, prices, validators = future.result()
+            except (requests.RequestException, ValueError) as e:
+                logger.info(f"[elpris] Error when fetching energy prices from {url}: {e}")
                 continue
 
-            json: List[Dict[str, str]] = resp.json()
-
-            values = [EnergyData(**p) for p in json]
+            if status == 304:
+                index.settled[area].add(day.isoformat())
+                continue
+            if status == 404 and day >= window[-2]:
+                logger.info(f"[elpris] Prices for {area} {day} are not published yet")
+                continue
+            if status != 200:
+                logger.info(f"[elpris] Error when fetching energy prices from {url}: HTTP {status}")
+                continue
 
-            points = [Point("energy_price")
-                      .tag("area", area)
-                      .field("SEK_per_kWh", float(p['SEK_per_kWh']))
-                      .field("100th_SEK_per_kWh", round(float(p['SEK_per_kWh']) * 100))
-                      .field("EUR_per_kWh", float(p['EUR_per_kWh']))
-                      .time(p['time_start'])
-                      for p in values]
-            write_influx(points)
+            values = [EnergyData(**p) for p in prices]
+
+            points.extend(Point("energy_price")
+                          .tag("area", area)
+                          .field("SEK_per_kWh", float(p['SEK_per_kWh']))
+                          .field("100th_SEK_per_kWh", round(float(p['SEK_per_kWh']) * 100))
+                          .field("EUR_per_kWh", float(p['EUR_per_kWh']))
+                          .time(p['time_start'])
+                          for p in values)
+            if values:
+                written.append((area, day, url, validators))
+
+    # One batch for every area and day of the run, written synchronously so
+    # days are only settled once they are stored, not just queued.
+    if written and not write_influx_confirmed(points):
+        logger.warning("[elpris] %d prices for %d area days not confirmed written, fetching them again next run",
+                       len(points), len(written))
+    else:
+        for area, day, url, validators in written:
+            index.settled[area].add(day.isoformat())
+            if validators:
+                index.validators[url] = validators
+        logger.info("[elpris] Wrote %d prices for %d area days", len(points), len(written))
+
+    _save_index(index)
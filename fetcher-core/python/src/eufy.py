@@ -3,13 +3,15 @@ import json
 import logging
 import os
 import time
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import requests
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.padding import PKCS7
 
+import http_pool
+import sessions
 from influx import write_influx, Point
 
 logger = logging.getLogger(__name__)
@@ -20,6 +22,8 @@ eufy_country = os.environ.get('EUFY_COUNTRY', 'se')
 gemini_token = os.environ.get('GEMINI_TOKEN', '')
 
 DOMAIN_BASE = "https://extend.eufylife.com"
+# Assumed token lifetime when the login response doesn't say.
+DEFAULT_TOKEN_SECONDS = 24 * 3600
 SERVER_PUBLIC_KEY_HEX = "04c5c00c4f8d1197cc7c3167c52bf7acb054d722f0ef08dcd7e0883236e0d72a3868d9750cb47fa4619248f3d83f0f662671dadc6e2d31c2f41db0161651c7c076"
 
 BASE_HEADERS = {
@@ -102,7 +106,7 @@ def _solve_captcha(captcha_img: str) -> Optional[str]:
             {"inline_data": {"mime_type": mime_type, "data": b64data}},
         ]
 
-    resp = requests.post(
+    resp = http_pool.session('gemini').post(
         f"https://generativelanguage.googleapis.com/v1beta/models/gemini-3-pro-preview:generateContent?key={gemini_token}",
         json={"contents": [{"parts": parts}]},
         timeout=120,
@@ -114,7 +118,7 @@ def _solve_captcha(captcha_img: str) -> Optional[str]:
 
 
 def _login(session: requests.Session, api_base: str) -> tuple:
-    """Login and return (token, shared_key)."""
+    """Login and return (token, shared_key, expires_at)."""
     private_key = ec.generate_private_key(ec.SECP256R1())
     pub_numbers = private_key.public_key().public_numbers()
     client_pub_hex = "04" + format(pub_numbers.x, '064x') + format(pub_numbers.y, '064x')
@@ -172,8 +176,10 @@ def _login(session: requests.Session, api_base: str) -> tuple:
     if server_key_info and server_key_info.get("public_key"):
         shared_key = _ecdh_shared_secret(private_key, server_key_info["public_key"])
 
+    expires_at = data.get("token_expires_at") or time.time() + DEFAULT_TOKEN_SECONDS
+
     logger.info("[eufy] Logged in as %s", data.get("nick_name", data.get("email")))
-    return token, shared_key
+    return token, shared_key, expires_at
 
 
 def _api_request(session: requests.Session, api_base: str, endpoint: str, token: str, shared_key: bytes, json_data=None):
@@ -233,26 +239,52 @@ def eufy():
         logger.exception("[eufy] Failed to execute eufy module")
 
 
-def _eufy():
-    logger.info("[eufy] Fetching Eufy device data...")
-
-    # Resolve API domain
-    resp = requests.get(f"{DOMAIN_BASE}/domain/{eufy_country.upper()}", timeout=30)
+def _resolve_domain(session: requests.Session) -> str:
+    resp = session.get(f"{DOMAIN_BASE}/domain/{eufy_country.upper()}", timeout=30)
     resp.raise_for_status()
     domain_data = resp.json()
     if domain_data.get("code") != 0:
         raise RuntimeError(f"Domain resolution failed: {domain_data.get('msg')}")
-    api_base = f"https://{domain_data['data']['domain']}"
+    return f"https://{domain_data['data']['domain']}"
+
+
+def _session(session: requests.Session) -> Tuple[str, str, bytes, bool]:
+    """(api_base, token, shared_key, reused): the stored session, or a fresh login.
+
+    Logging in every run is what makes Eufy ask for a CAPTCHA, so the token
+    and shared key are kept in the session store until shortly before they expire.
+    """
+    stored = sessions.get('eufy', eufy_username)
+    if stored is not None:
+        return stored["api_base"], stored["token"], base64.b64decode(stored["shared_key"]), True
 
-    session = requests.Session()
-    session.headers.update(BASE_HEADERS)
-    session.headers["Country"] = eufy_country.upper()
+    api_base = _resolve_domain(session)
+    token, shared_key, expires_at = _login(session, api_base)
+    sessions.put('eufy', eufy_username, {
+        "api_base": api_base,
+        "token": token,
+        "shared_key": base64.b64encode(shared_key).decode(),
+    }, expires_at)
+    return api_base, token, shared_key, False
 
-    # Login
-    token, shared_key = _login(session, api_base)
+
+def _eufy():
+    logger.info("[eufy] Fetching Eufy device data...")
+
+    session = http_pool.session('eufy', dict(BASE_HEADERS, Country=eufy_country.upper()))
+
+    api_base, token, shared_key, reused = _session(session)
 
     # Fetch devices
-    devices = _get_devices(session, api_base, token, shared_key)
+    try:
+        devices = _get_devices(session, api_base, token, shared_key)
+    except (requests.HTTPError, RuntimeError) as e:
+        if not reused:
+            raise
+        logger.warning("[eufy] Stored session rejected (%s), logging in again", e)
+        sessions.drop('eufy', eufy_username)
+        api_base, token, shared_key, _ = _session(session)
+        devices = _get_devices(session, api_base, token, shared_key)
     logger.info("[eufy] Found %d device(s)", len(devices))
 
     points: List[Point] = []
@@ -336,7 +368,7 @@ def eufy_snapshot():
         filepath = os.path.join(SNAPSHOT_DIR, f"{device_sn}_{ts}.jpg")
 
         try:
-            img_resp = requests.get(cover_path, timeout=30)
+            img_resp = http_pool.session('eufy-cdn').get(cover_path, timeout=30)
             img_resp.raise_for_status()
             with open(filepath, "wb") as f:
                 f.write(img_resp.content)
@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Set
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# Shared HTTP client of the requests based collectors. Each collector gets
+# one keep-alive session, with up to HTTP_POOL_SIZE connections to each of
+# at most HTTP_POOL_HOSTS hosts, instead of a new TCP+TLS connection per call.
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '4'))
+HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', '10'))
+
+# Default timeout of a request, unless the call passes its own.
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '30'))
+
+# Connection errors, and 429/502/503/504 responses to idempotent requests,
+# are retried this many times with exponential backoff (honouring
+# Retry-After). POSTs are only retried when they never reached the server.
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '2'))
+HTTP_RETRY_BACKOFF = 0.5
+
+REQUESTS = metrics.Counter('fetcher_http_requests_total', 'Outgoing HTTP requests by host and status class.',
+                           ['host', 'status'])
+DURATION = metrics.Histogram('fetcher_http_request_duration_seconds', 'Latency of outgoing HTTP requests.', ['host'],
+                             buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+CONNECTIONS = metrics.Counter('fetcher_http_connections_opened_total',
+                              'New connections per host; requests minus this were served on a kept-alive one.',
+                              ['host'])
+RETRIES = metrics.Counter('fetcher_http_retries_total', 'Requests retried by the retry policy.', ['host'])
+
+
+class _Adapter(HTTPAdapter):
+    """HTTPAdapter recording latency, status and new connections per host."""
+
+    def __init__(self):
+        retry = Retry(total=HTTP_RETRIES, read=0, status_forcelist=(429, 502, 503, 504),
+                      backoff_factor=HTTP_RETRY_BACKOFF, raise_on_status=False)
+        super().__init__(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE,
+                         max_retries=retry, pool_block=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Connections each pool had opened when last looked at.
+        self._opened: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        pool = super().get_connection_with_tls_context(request, verify, proxies=proxies, cert=cert)
+        self._local.pool = pool
+        return pool
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).hostname or ''
+        self._local.pool = None
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except requests.RequestException:
+            REQUESTS.inc(host=host, status='error')
+            raise
+        finally:
+            DURATION.observe(time.perf_counter() - started, host=host)
+            self._count_connections(host)
+        REQUESTS.inc(host=host, status=f"{response.status_code // 100}xx")
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            RETRIES.inc(len(retries.history), host=host)
+        return response
+
+    def _count_connections(self, host: str) -> None:
+        pool = getattr(self._local, 'pool', None)
+        if pool is None:
+            return
+        with self._lock:
+            opened = pool.num_connections
+            new = opened - self._opened.get(pool, 0)
+            if new > 0:
+                self._opened[pool] = opened
+                CONNECTIONS.inc(new, host=host)
+
+
+class _Session(requests.Session):
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+_sessions: Dict[str, requests.Session] = {}
+# Headers each session was created with, to catch callers passing others.
+_headers: Dict[str, Dict[str, str]] = {}
+_mismatched: Set[str] = set()
+_lock = threading.Lock()
+
+
+def session(name: str, headers: Optional[Dict[str, str]] = None) -> requests.Session:
+    """The shared session of collector `name`, created on first use.
+
+    Collectors get a session each so their cookies and default headers
+    never mix. `headers` only applies when the session is created, so every
+    call for `name` must pass the same ones; calls that need other headers
+    (or none) use a session of their own. A mismatch is logged once.
+    """
+    headers = dict(headers or {})
+    with _lock:
+        s = _sessions.get(name)
+        if s is not None and headers != _headers[name] and name not in _mismatched:
+            _mismatched.add(name)
+            logger.warning("[http] Session %s was created with other default headers (%s), ignoring these (%s)",
+                           name, ', '.join(sorted(_headers[name])) or 'none', ', '.join(sorted(headers)) or 'none')
+        if s is None:
+            s = _Session()
+            adapter = _Adapter()
+            s.mount('https://', adapter)
+            s.mount('http://', adapter)
+            if headers:
+                s.headers.update(headers)
+            _sessions[name] = s
+            _headers[name] = headers
+            logger.debug("[http] New session for %s", name)
+        return s
@@ -1,28 +1,455 @@
+import atexit
 import logging
 import os
-from typing import List
+import random
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
 
-from influxdb_client_3 import InfluxDBClient3, Point
+import requests
 
-# InfluxDB v3 Cloud configuration
-influx_host = os.environ.get('INFLUX_HOST', '')
-influx_token = os.environ.get('INFLUX_TOKEN', '')
-influx_database = os.environ.get('INFLUX_DATABASE', 'irisgatan')
+import cardinality
+import delta
+import lineprotocol
+import metrics
+import sinks
+from point import Point
+from scheduler import FETCHER_STATE_DIR, collection_time, record_points
+from sinks import Sink, WriteError
+from spool import Spool
 
+INFLUX_TIMEOUT = sinks.INFLUX_TIMEOUT
 
-def write_influx(points: List[Point]):
-    if not influx_host or not influx_token:
-        logging.error("INFLUX_HOST and INFLUX_TOKEN must be configured for v3 Cloud")
+# Writes are queued per sink and flushed from a background thread in batches
+# of up to INFLUX_BATCH_POINTS points / INFLUX_BATCH_BYTES bytes, at the latest
+# INFLUX_BATCH_DELAY seconds after the first queued point. A delay of 0
+# writes synchronously from the collector instead.
+INFLUX_BATCH_POINTS = int(os.environ.get('INFLUX_BATCH_POINTS', '5000'))
+INFLUX_BATCH_BYTES = int(os.environ.get('INFLUX_BATCH_BYTES', str(1024 * 1024)))
+INFLUX_BATCH_DELAY = float(os.environ.get('INFLUX_BATCH_DELAY', '5'))
+INFLUX_QUEUE_MAX_POINTS = int(os.environ.get('INFLUX_QUEUE_MAX_POINTS', '100000'))
+
+# Batches that fail with a connection error, 5xx or 429 are spooled to disk
+# (capped at INFLUX_SPOOL_MAX_MB per sink, oldest evicted first, 0 disables
+# it) and replayed in order with exponential backoff once the TSDB is back.
+# The influx sink spools to INFLUX_SPOOL_DIR, other sinks to a subdirectory.
+INFLUX_SPOOL_DIR = os.environ.get('INFLUX_SPOOL_DIR', os.path.join(FETCHER_STATE_DIR, 'spool'))
+INFLUX_SPOOL_MAX_MB = float(os.environ.get('INFLUX_SPOOL_MAX_MB', '100'))
+SPOOL_RETRY_MIN_SECONDS = 5
+SPOOL_RETRY_MAX_SECONDS = 300
+
+# Retryable failures (connection errors, 5xx, 429) are retried INFLUX_RETRIES
+# times with jittered exponential backoff before the batch is spooled.
+# Batches rejected as malformed (400/422) are bisected until the offending
+# lines are isolated; those go to INFLUX_QUARANTINE_FILE (suffixed with the
+# sink name for other sinks), the rest is written.
+INFLUX_RETRIES = int(os.environ.get('INFLUX_RETRIES', '3'))
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+INFLUX_QUARANTINE_FILE = os.environ.get('INFLUX_QUARANTINE_FILE', os.path.join(FETCHER_STATE_DIR, 'quarantine.lp'))
+QUARANTINE_MAX_BYTES = 10 * 1024 * 1024
+# Lines quoted (truncated) when logging a failed or quarantined batch.
+LOG_SAMPLE_LINES = 3
+LOG_SAMPLE_CHARS = 200
+
+# Set inside collector worker processes: points are handed to this callback
+# as line protocol and the parent process writes them. Confirmed writes go to
+# the second one, which waits for the parent's answer.
+_forward: Optional[Callable[[List[str]], None]] = None
+_forward_confirmed: Optional[Callable[[List[str]], bool]] = None
+
+
+WRITE_DURATION = metrics.Histogram('fetcher_influx_write_duration_seconds', 'Latency of writes, by sink.', ['sink'],
+                                   buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+WRITE_BYTES = metrics.Counter('fetcher_influx_write_bytes_total', 'Line protocol bytes written.', ['sink'])
+WRITE_POINTS = metrics.Counter('fetcher_influx_points_total', 'Points written.', ['sink'])
+WRITE_ERRORS = metrics.Counter('fetcher_influx_write_errors_total', 'Failed writes.', ['sink'])
+QUEUE_DEPTH = metrics.Gauge('fetcher_influx_queue_points', 'Points waiting in the write queue.', ['sink'])
+BATCH_SIZE = metrics.Histogram('fetcher_influx_batch_points', 'Points per write request.', ['sink'],
+                               buckets=(1, 10, 50, 100, 500, 1000, 2500, 5000, 10000))
+FLUSHES = metrics.Counter('fetcher_influx_flushes_total', 'Write batches flushed, by trigger.', ['sink', 'reason'])
+DROPPED = metrics.Counter('fetcher_influx_dropped_points_total', 'Points dropped because the write queue was full.',
+                          ['sink'])
+SPOOL_SEGMENTS = metrics.Gauge('fetcher_influx_spool_segments', 'Batches waiting in the on-disk spool.', ['sink'])
+SPOOL_BYTES = metrics.Gauge('fetcher_influx_spool_bytes', 'Size of the on-disk spool.', ['sink'])
+SPOOLED = metrics.Counter('fetcher_influx_spooled_points_total', 'Points spooled to disk after a failed write.',
+                          ['sink'])
+REPLAYED = metrics.Counter('fetcher_influx_replayed_points_total', 'Spooled points written on replay.', ['sink'])
+EVICTED = metrics.Counter('fetcher_influx_evicted_points_total', 'Spooled points evicted to stay under the size cap.',
+                          ['sink'])
+RETRIES = metrics.Counter('fetcher_influx_write_retries_total', 'Write attempts retried after a retryable failure.',
+                          ['sink'])
+QUARANTINED = metrics.Counter('fetcher_influx_quarantined_points_total', 'Points rejected as malformed and quarantined.',
+                              ['sink'])
+DROPPED_FAILED = metrics.Counter('fetcher_influx_failed_points_total',
+                                 'Points lost to failed writes that could not be spooled.', ['sink'])
+
+
+def forward_to(callback: Optional[Callable[[List[str]], None]],
+               confirmed: Optional[Callable[[List[str]], bool]] = None) -> None:
+    global _forward, _forward_confirmed
+    _forward = callback
+    _forward_confirmed = confirmed
+
+
+def _digest(lines: List[str]) -> int:
+    """Order-independent fingerprint of a batch, used to tell whether values changed."""
+    return hash(frozenset(lines))
+
+
+def _retryable(e: Exception) -> bool:
+    """Whether a failed write may succeed later, as opposed to being rejected for its content."""
+    if isinstance(e, WriteError):
+        return e.status >= 500 or e.status == 429
+    return isinstance(e, requests.RequestException)
+
+
+def _malformed(e: Exception) -> bool:
+    return isinstance(e, WriteError) and e.status in (400, 422)
+
+
+def _sample(lines: List[str]) -> str:
+    """A bounded excerpt of `lines` for log messages."""
+    return '; '.join(line[:LOG_SAMPLE_CHARS] for line in lines[:LOG_SAMPLE_LINES])
+
+
+class _Output:
+    """The write path of one sink: batching, retries, quarantine, spool and replay.
+
+    Every sink gets its own, so a slow or failing sink never holds up or
+    loses points for the others.
+    """
+
+    def __init__(self, sink: Sink):
+        self.sink = sink
+        self.name = sink.name
+        default = sink.name == 'influx'
+        self.spool: Optional[Spool] = None
+        if sink.remote and INFLUX_SPOOL_MAX_MB > 0:
+            directory = INFLUX_SPOOL_DIR if default else os.path.join(INFLUX_SPOOL_DIR, sink.name)
+            self.spool = Spool(directory, int(INFLUX_SPOOL_MAX_MB * 1e6))
+        root, ext = os.path.splitext(INFLUX_QUARANTINE_FILE)
+        self.quarantine_file = INFLUX_QUARANTINE_FILE if default else f"{root}-{sink.name}{ext}"
+        self.replayer = _Replayer(self)
+        self.batcher = _Batcher(self)
+
+    def write(self, lines: List[str]) -> None:
+        started = time.perf_counter()
+        try:
+            self.sink.write(lines)
+        except requests.RequestException:
+            WRITE_ERRORS.inc(sink=self.name)
+            self.sink.reset()
+            raise
+        except Exception:
+            WRITE_ERRORS.inc(sink=self.name)
+            raise
+        finally:
+            WRITE_DURATION.observe(time.perf_counter() - started, sink=self.name)
+        WRITE_POINTS.inc(len(lines), sink=self.name)
+        WRITE_BYTES.inc(sum(len(line) + 1 for line in lines), sink=self.name)
+
+    def _write_retrying(self, lines: List[str]) -> None:
+        attempt = 0
+        while True:
+            try:
+                self.write(lines)
+                return
+            except Exception as e:
+                if not _retryable(e) or attempt >= INFLUX_RETRIES:
+                    raise
+                delay = min(RETRY_BASE_SECONDS * 2 ** attempt, RETRY_MAX_SECONDS) * random.uniform(0.5, 1.5)
+                attempt += 1
+                RETRIES.inc(sink=self.name)
+                logging.info("Writing %d values to %s failed (%s), retry %d/%d in %.1fs",
+                             len(lines), self.name, e, attempt, INFLUX_RETRIES, delay)
+                time.sleep(delay)
+
+    def _quarantine(self, lines: List[str], error: Exception) -> None:
+        QUARANTINED.inc(len(lines), sink=self.name)
+        path = self.quarantine_file
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > QUARANTINE_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, 'a') as f:
+                f.write(f"# {time.strftime('%Y-%m-%dT%H:%M:%S')} {str(error)[:LOG_SAMPLE_CHARS]}\n")
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logging.warning("Unable to quarantine %d values: %s", len(lines), e)
+
+    def _bisect(self, lines: List[str], bad: List[str]) -> None:
+        """Write both halves of a rejected batch, recursing until single bad lines are left in `bad`."""
+        if len(lines) == 1:
+            bad.extend(lines)
+            return
+        mid = len(lines) // 2
+        for half in (lines[:mid], lines[mid:]):
+            self.deliver(half, bad)
+
+    def deliver(self, lines: List[str], bad: Optional[List[str]] = None) -> bool:
+        """Write `lines` with retries; spool them if the sink stays unreachable, bisect them if rejected.
+
+        True when the sink stored all of them.
+        """
+        try:
+            self._write_retrying(lines)
+            return True
+        except Exception as e:
+            if _malformed(e):
+                if bad is not None:
+                    self._bisect(lines, bad)
+                    return False
+                bad = []
+                self._bisect(lines, bad)
+                self._quarantine(bad, e)
+                logging.warning("Batch of %d values rejected by %s (%s), quarantined %d: %s",
+                                len(lines), self.name, e, len(bad), _sample(bad))
+            elif self.spool is not None and _retryable(e):
+                logging.warning("Unable to write %d values to %s, spooling them: %s", len(lines), self.name, e)
+                self._spool_batch(lines)
+            else:
+                DROPPED_FAILED.inc(len(lines), sink=self.name)
+                logging.warning("Unable to write %d values to %s: %s; e.g. %s",
+                                len(lines), self.name, e, _sample(lines))
+            return False
+
+    def send(self, lines: List[str], reason: str) -> bool:
+        """Write a batch now, in chunks of at most INFLUX_BATCH_POINTS. True when all of it was stored."""
+        stored = True
+        for i in range(0, len(lines), INFLUX_BATCH_POINTS):
+            chunk = lines[i:i + INFLUX_BATCH_POINTS]
+            BATCH_SIZE.observe(len(chunk), sink=self.name)
+            FLUSHES.inc(sink=self.name, reason=reason)
+            if not self.deliver(chunk):
+                delta.forget(chunk)
+                stored = False
+        return stored
+
+    def put(self, lines: List[str]) -> None:
+        if INFLUX_BATCH_DELAY <= 0:
+            self.send(lines, 'unbatched')
+        else:
+            self.batcher.put(lines)
+
+    def update_spool_metrics(self) -> None:
+        segments, size = self.spool.stats()
+        SPOOL_SEGMENTS.set(segments, sink=self.name)
+        SPOOL_BYTES.set(size, sink=self.name)
+
+    def _spool_batch(self, lines: List[str]) -> None:
+        try:
+            EVICTED.inc(self.spool.append(lines), sink=self.name)
+        except OSError as e:
+            logging.warning("Unable to spool %d values, dropping them: %s", len(lines), e)
+            return
+        SPOOLED.inc(len(lines), sink=self.name)
+        self.update_spool_metrics()
+        self.replayer.wake()
+
+
+class _Replayer:
+    """Background thread writing spooled batches back, oldest first, backing off while the sink is down."""
+
+    def __init__(self, output: _Output):
+        self.output = output
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.output.spool is None or self._thread is not None:
+            return
+        self.output.update_spool_metrics()
+        self._thread = threading.Thread(target=self._run, name=f'influx-replay-{self.output.name}', daemon=True)
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+
+    def _sleep(self, seconds: float) -> None:
+        self._wake.wait(seconds)
+        self._wake.clear()
+
+    def _run(self) -> None:
+        output, spool = self.output, self.output.spool
+        backoff = SPOOL_RETRY_MIN_SECONDS
+        while not self._stopping:
+            segment = spool.peek()
+            if segment is None:
+                self._sleep(SPOOL_RETRY_MAX_SECONDS)
+                continue
+
+            seq, lines = segment
+            try:
+                output.write(lines)
+            except Exception as e:
+                if not _retryable(e):
+                    # Rejected for its content: salvage what is valid.
+                    spool.remove(seq)
+                    output.update_spool_metrics()
+                    output.deliver(lines)
+                    continue
+                delay = backoff * random.uniform(0.5, 1.5)
+                logging.info("Replay of values spooled for %s failed, retrying in %.0fs: %s", output.name, delay, e)
+                backoff = min(backoff * 2, SPOOL_RETRY_MAX_SECONDS)
+                # Newly spooled batches wake the thread too; only stop() may cut the backoff short.
+                deadline = time.monotonic() + delay
+                while not self._stopping and time.monotonic() < deadline:
+                    self._sleep(deadline - time.monotonic())
+                continue
+
+            spool.remove(seq)
+            REPLAYED.inc(len(lines), sink=output.name)
+            output.update_spool_metrics()
+            backoff = SPOOL_RETRY_MIN_SECONDS
+            segments, _ = spool.stats()
+            logging.info("Replayed %d values spooled for %s, %d batches left", len(lines), output.name, segments)
+
+
+class _Batcher:
+    """Coalesces writes from all collectors into large batches on a background thread.
+
+    A batch is flushed once it holds INFLUX_BATCH_POINTS points or
+    INFLUX_BATCH_BYTES bytes, or once its oldest point waited
+    INFLUX_BATCH_DELAY seconds; whatever is left is flushed on close().
+    """
+
+    def __init__(self, output: _Output):
+        self.output = output
+        self._lines: List[str] = []
+        self._bytes = 0
+        self._oldest: Optional[float] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def put(self, lines: List[str]) -> None:
+        name = self.output.name
+        size = sum(len(line) + 1 for line in lines)
+        with self._cond:
+            if self._closed:
+                flush_now = True
+            else:
+                flush_now = False
+                if len(self._lines) + len(lines) > INFLUX_QUEUE_MAX_POINTS:
+                    DROPPED.inc(len(lines), sink=name)
+                    delta.forget(lines)
+                    logging.warning("Write queue of %s full (%d points), dropping %d values",
+                                    name, len(self._lines), len(lines))
+                    return
+                self._lines.extend(lines)
+                self._bytes += size
+                # The writer waits without a timeout while the queue is empty.
+                was_empty = self._oldest is None
+                if was_empty:
+                    self._oldest = time.monotonic()
+                QUEUE_DEPTH.set(len(self._lines), sink=name)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f'influx-writer-{name}', daemon=True)
+                    self._thread.start()
+                if was_empty or self._full():
+                    self._cond.notify()
+        if flush_now:
+            self.output.send(lines, 'closed')
+
+    def _full(self) -> bool:
+        return len(self._lines) >= INFLUX_BATCH_POINTS or self._bytes >= INFLUX_BATCH_BYTES
+
+    def _next_batch(self) -> Tuple[Optional[List[str]], str]:
+        """Block until a batch is due; (None, ...) once closed and drained."""
+        with self._cond:
+            while True:
+                if self._lines:
+                    if self._full():
+                        reason = 'size'
+                        break
+                    if self._closed:
+                        reason = 'closed'
+                        break
+                    remaining = self._oldest + INFLUX_BATCH_DELAY - time.monotonic()
+                    if remaining <= 0:
+                        reason = 'delay'
+                        break
+                    self._cond.wait(remaining)
+                elif self._closed:
+                    return None, 'closed'
+                else:
+                    self._cond.wait()
+            batch = self._lines
+            self._lines = []
+            self._bytes = 0
+            self._oldest = None
+            QUEUE_DEPTH.set(0, sink=self.output.name)
+            return batch, reason
+
+    def _run(self) -> None:
+        while True:
+            batch, reason = self._next_batch()
+            if batch is None:
+                return
+            self.output.send(batch, reason)
+
+    def close(self, timeout: float) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+_output_list: Optional[List[_Output]] = None
+_outputs_lock = threading.Lock()
+
+
+def _outputs() -> List[_Output]:
+    """One output per configured sink, created on first use."""
+    global _output_list
+    with _outputs_lock:
+        if _output_list is None:
+            _output_list = [_Output(sink) for sink in sinks.configured()]
+            if _output_list:
+                logging.debug("Writing to %s", ', '.join(o.name for o in _output_list))
+        return _output_list
+
+
+def start_replay() -> None:
+    """Replay batches spooled by this or an earlier run in the background."""
+    for output in _outputs():
+        output.replayer.start()
+
+
+def _stamp(lines: List[str]) -> List[str]:
+    """Give lines without a timestamp the collection time of the current run, or now.
+
+    Done before batching so points keep the time they were collected at
+    however long they wait in the queue or the spool.
+    """
+    stamp = collection_time.get()
+    suffix = f" {stamp if stamp is not None else int(time.time())}"
+    return [line if lineprotocol.has_timestamp(line) else line + suffix for line in lines]
+
+
+def _enqueue(lines: List[str]) -> None:
+    record_points(len(lines), _digest(lines))
+    # Delta suppression only considers untimestamped lines, so stamp after it.
+    lines = _stamp(delta.suppress(cardinality.guard(lines)))
+    if not lines:
         return
+    for output in _outputs():
+        output.put(lines)
 
-    logging.debug("Connecting to InfluxDB v3 Cloud...")
 
-    client = InfluxDBClient3(
-        host=influx_host,
-        token=influx_token,
-        database=influx_database
-    )
+def _serialize(points: List[Point]) -> List[str]:
+    return [line for line in (p.to_line_protocol(precision='s') for p in points) if line]
 
+
+def _log_points(points: List[Point]) -> None:
     if len(points) > 4:
         logging.info("Writing points to InfluxDB... %s (and %d more)",
                      ', '.join(map(lambda x: f"{x._name}", points[0:3])), len(points)-3)
@@ -30,8 +457,85 @@ def write_influx(points: List[Point]):
         logging.info("Writing points to InfluxDB... %s",
                      ', '.join(map(lambda x: f"{x._name} ({len(x._fields)} fields, {len(x._tags)} tags)", points)))
 
-    try:
-        client.write(record=points, write_precision='s')
-    except Exception as e:
-        logging.warning("Unable to write the values: %s %s",
-                        ', '.join(map(lambda x: str(x), points)), e)
+
+def flush(timeout: float = INFLUX_TIMEOUT) -> None:
+    """Write everything still queued and stop the background writers. Later writes go out directly."""
+    deadline = time.monotonic() + timeout
+    outputs = _output_list or []
+    for output in outputs:
+        output.batcher.close(max(0.0, deadline - time.monotonic()))
+    for output in outputs:
+        output.replayer.stop()
+
+
+atexit.register(flush)
+
+
+def write_influx(points: List[Point]):
+    lines = _serialize(points)
+    if _forward is not None:
+        _forward(lines)
+        return
+    if not lines:
+        return
+
+    if not _outputs():
+        return
+
+    _log_points(points)
+    _enqueue(lines)
+
+
+def write_influx_confirmed(points: List[Point]) -> bool:
+    """Write `points` now, bypassing the batch queue, and report whether every sink stored them as given.
+
+    False when no sink is configured, when any point was spooled,
+    quarantined or dropped, and when a cardinality limit dropped points or
+    folded their tags. Unchanged fields dropped by delta suppression count
+    as stored, they were written before. In worker processes the parent
+    writes the points and sends the answer back.
+    """
+    lines = _serialize(points)
+    if _forward is not None:
+        if _forward_confirmed is None:
+            _forward(lines)
+            return False
+        return _forward_confirmed(lines)
+    if lines and _outputs():
+        _log_points(points)
+    return _write_confirmed(lines)
+
+
+def write_lines_confirmed(lines: List[str]) -> bool:
+    """write_influx_confirmed for points a worker process already serialized."""
+    if lines and _outputs():
+        logging.info("Writing %d forwarded points to InfluxDB, confirmed...", len(lines))
+    return _write_confirmed(lines)
+
+
+def _write_confirmed(lines: List[str]) -> bool:
+    if not _outputs():
+        return False
+    if not lines:
+        return True
+
+    record_points(len(lines), _digest(lines))
+    kept = cardinality.guard(lines)
+    stored = kept == lines
+    lines = _stamp(delta.suppress(kept))
+    for output in _outputs():
+        if not output.send(lines, 'confirmed'):
+            stored = False
+    return stored
+
+
+def write_lines(lines: List[str]):
+    """Write points that were already serialized to line protocol, e.g. by a worker process."""
+    if not lines:
+        return
+
+    if not _outputs():
+        return
+
+    logging.info("Writing %d forwarded points to InfluxDB...", len(lines))
+    _enqueue(lines)
@@ -0,0 +1,88 @@
+"""Splitting serialized line protocol back into its parts.
+
+Used by the write path stages that work on batches of lines (delta
+suppression, cardinality guard) rather than on Point objects, so points
+forwarded from worker processes go through them too.
+"""
+from typing import List, Optional, Tuple
+
+
+def _find(s: str, chars: str, start: int = 0) -> int:
+    """Index of the first unescaped char of `chars` in `s`, or len(s)."""
+    i, n = start, len(s)
+    while i < n and s[i] not in chars:
+        i += 2 if s[i] == '\\' else 1
+    return min(i, n)
+
+
+def split(line: str) -> Optional[Tuple[str, List[Tuple[str, str]], bool]]:
+    """Split a line into (series key, [(field, raw value)], has timestamp).
+
+    Honours backslash escapes and quoted string values; returns None for
+    anything it can't parse so callers can pass the line through untouched.
+    """
+    n = len(line)
+    i = _find(line, ' ')
+    if i >= n:
+        return None
+    series = line[:i]
+
+    fields: List[str] = []
+    start = i = i + 1
+    quoted = False
+    while i < n:
+        c = line[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '"':
+            quoted = not quoted
+        elif not quoted and c in ', ':
+            fields.append(line[start:i])
+            start = i + 1
+            if c == ' ':
+                break
+        i += 1
+    else:
+        fields.append(line[start:])
+    timestamped = i < n
+
+    out = []
+    for field in fields:
+        j = _find(field, '=')
+        if j >= len(field):
+            return None
+        out.append((field[:j], field[j + 1:]))
+    return series, out, timestamped
+
+
+def has_timestamp(line: str) -> bool:
+    """Whether a line ends in a timestamp, without parsing it.
+
+    The last space-separated token of a line is either the timestamp or
+    part of the field set, and field set tokens always contain a '='.
+    """
+    tail = line[line.rfind(' ') + 1:]
+    return '=' not in tail and tail.lstrip('-').isdigit()
+
+
+def split_series(series: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """Split a series key into its escaped measurement and [(tag, value)] pairs."""
+    end = _find(series, ',')
+    measurement = series[:end]
+    tags = []
+    while end < len(series):
+        start = end + 1
+        end = _find(series, ',', start)
+        pair = series[start:end]
+        j = _find(pair, '=')
+        tags.append((pair[:j], pair[j + 1:]))
+    return measurement, tags
+
+
+def join_series(measurement: str, tags: List[Tuple[str, str]]) -> str:
+    return ','.join([measurement] + [f"{k}={v}" for k, v in tags])
+
+
+def unescape(s: str) -> str:
+    return s.replace('\\', '')
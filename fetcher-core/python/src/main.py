@@ -1,93 +1,90 @@
-import concurrent.futures
+import asyncio
 import logging
 import os
+import signal
 import sys
-import time
+from typing import List
+
 import schedule
 
-# from balboa import balboa  # Disabled - now handled by Home Assistant
-# from balboa import balboa_control  # Disabled - now handled by Home Assistant
-from deco import deco
-from elpris import elpris
-from ngenic import ngenic
-from aqualink import aqualink
-from airquality import airquality
-from aquatemp import aquatemp
-from tapo import tapo
-from sonos import sonos
-from backup_vm import backup_vm
-from eufy import eufy, eufy_snapshot
+import adaptive
+import collectors
+import influx
+import metrics
+import profiling
+import scheduler
+import worker
 
 logging.basicConfig(level=logging.INFO,
                     format='%(levelname)s %(message)s')
 
 
-def with_timeout(func, timeout_seconds=120):
-    """Wrap a scheduled job with a timeout to prevent the scheduler from getting stuck."""
-    def wrapper():
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(func)
-            try:
-                future.result(timeout=timeout_seconds)
-            except concurrent.futures.TimeoutError:
-                logging.error("[scheduler] %s timed out after %ds", func.__name__, timeout_seconds)
-            except Exception as e:
-                logging.error("[scheduler] %s failed: %s", func.__name__, e)
-    wrapper.__name__ = func.__name__
-    return wrapper
-
-
-if os.environ.get('PYDEBUGGER', None):
-    import debugpy
-    debugpy.listen(("0.0.0.0", 5678))
-    debugpy.wait_for_client()
-    debugpy.breakpoint()
-
-
 def main():
-    if len(sys.argv) > 1 and sys.argv[1] in ['deco', 'elpris', 'ngenic', 'aqualink', 'aquatemp', 'airquality', 'tapo', 'sonos', 'backup_vm', 'eufy', 'eufy_snapshot']:
+    if len(sys.argv) > 1 and sys.argv[1] in collectors.names():
         module_name = sys.argv[1]
         logging.info(f"Running module: {module_name}")
-        for m in [deco, elpris, ngenic, aqualink, aquatemp, airquality, tapo, sonos, backup_vm, eufy, eufy_snapshot]:
-            if m.__name__ == module_name:
-                logging.info(f"Executing {module_name} module...")
-                m()
+        collector = collectors.get(module_name)
+        missing = collectors.missing_env(collector)
+        if missing:
+            logging.error(f"{module_name} is not configured, missing {', '.join(missing)}")
+            return
+        profiling.install()
+        m = profiling.wrap(collectors.load(collector))
+        collectors.log_import_report()
+        logging.info(f"Executing {module_name} module...")
+        asyncio.run(scheduler.run_job(m, timeout_seconds=None))
+        influx.flush()
         return
 
     logging.info("Starting the scheduler...")
-    schedule.every(1).minutes.do(with_timeout(aqualink))
-    schedule.every(5).minutes.do(with_timeout(ngenic))
-    # sigenergy now handled by the sigenergy-bridge Go service
-    # schedule.every(5).minutes.do(with_timeout(balboa))
-    schedule.every(5).minutes.do(with_timeout(aquatemp))
-    schedule.every(5).minutes.do(with_timeout(deco))
-    schedule.every(5).minutes.do(with_timeout(tapo))
-    schedule.every(5).minutes.do(with_timeout(eufy))
-    schedule.every(1).minutes.do(with_timeout(sonos))
+    metrics.start_server()
+    influx.start_replay()
+    scheduler.load_state()
+    scheduler.add_listener(lambda name, state: scheduler.save_state())
+    profiling.install()
+    warm_start_jobs: List[schedule.Job] = []
+    for collector in collectors.configured():
+        if worker.enabled():
+            func = worker.proxy(collector, nice=scheduler.LANES[collector.lane].nice)
+            timeout_seconds = collector.timeout_seconds + worker.KILL_GRACE_SECONDS
+        else:
+            func = profiling.wrap(collectors.load(collector))
+            timeout_seconds = collector.timeout_seconds
+        bounds = adaptive.bounds_for(collector.name, collector.adaptive)
+        for every in collector.schedules:
+            j = every().do(scheduler.job(func, timeout_seconds, collector.lane))
+            if bounds:
+                adaptive.register(j, *bounds)
+            # Without history, fall back to the collector's warm start setting.
+            due = scheduler.resume(j)
+            if due or (due is None and collector.warm_start):
+                warm_start_jobs.append(j)
+            scheduler.align(j)
+    collectors.log_import_report()
 
-    # Primary: run right before the pool-pump-planner fires at 14:15 local,
-    # so day-ahead prices are fresh. Backup every 6h in case the primary is
-    # missed (container down, job slip, etc.).
-    schedule.every().day.at('14:03').do(with_timeout(elpris))
-    schedule.every(6).hours.do(with_timeout(elpris))
-    schedule.every(1).hours.at(':05').do(with_timeout(airquality))
-    # schedule.every(1).hours.at(':10').do(with_timeout(balboa_control))  # Disabled SPA module
-    schedule.every(3).hours.at(':15').do(with_timeout(eufy_snapshot))
+    try:
+        asyncio.run(_run(warm_start_jobs))
+    except KeyboardInterrupt:
+        pass
 
-    logging.info("Starting the scheduler, running all...")
-    schedule.run_all(delay_seconds=10)
 
-    # Avoid this from running every startup
-    schedule.every(12).hours.at(':10').do(with_timeout(backup_vm, timeout_seconds=3600))
+async def _run(warm_start_jobs: List[schedule.Job]):
+    logging.info("Starting the scheduler, running all...")
+    warm_start = asyncio.create_task(scheduler.warm_start(warm_start_jobs))
+    forever = asyncio.create_task(scheduler.run_forever())
+    # docker stop sends SIGTERM: stop scheduling and flush queued points.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, forever.cancel)
 
-    while 1:
-        schedule.run_pending()
-        try:
-            time.sleep(1)
-        except KeyboardInterrupt:
-            break
-        except Exception as e:
-            logging.info(f"An error occurred: {e}")
+    try:
+        await forever
+    except asyncio.CancelledError:
+        logging.info("Stopping the scheduler...")
+    finally:
+        warm_start.cancel()
+        await scheduler.shutdown()
+        # Before the workers: stopping them may have to wait for their processes.
+        influx.flush()
+        worker.shutdown()
 
 
 if __name__ == '__main__':
@@ -103,4 +100,12 @@ $$ |\$$$$$$  | \$$$$  |      $$ |     \$$$$$$$\  \$$$$  |\$$$$$$$\ $$ |  $$ |\$$
                                                                                                            
                                                      
 """, flush=True)
+
+    # Only in the scheduler process; worker processes re-import this module.
+    if os.environ.get('PYDEBUGGER', None):
+        import debugpy
+        debugpy.listen(("0.0.0.0", 5678))
+        debugpy.wait_for_client()
+        debugpy.breakpoint()
+
     main()
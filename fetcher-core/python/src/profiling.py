@@ -0,0 +1,173 @@
+import contextlib
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterable, List, Optional
+
+from scheduler import FETCHER_STATE_DIR, JobFunc
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# Collectors to profile, e.g. "tapo,eufy". They are profiled for their next
+# PROFILE_RUNS runs after startup and again after every SIGUSR1. With no
+# PROFILE_JOBS, SIGUSR1 profiles every collector.
+PROFILE_JOBS = os.environ.get('PROFILE_JOBS', '')
+PROFILE_RUNS = int(os.environ.get('PROFILE_RUNS', '3'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(FETCHER_STATE_DIR, 'profiles'))
+
+# Entries listed in the text report, and stack depth kept by tracemalloc.
+PROFILE_TOP = 30
+TRACEMALLOC_FRAMES = 5
+
+_ALL = '*'
+
+# Remaining profiled runs per job name (or _ALL).
+_armed: Dict[str, int] = {}
+_lock = threading.Lock()
+_tracing = 0
+# Held by the run being profiled: Python 3.12+ allows one active cProfile.
+_active = threading.Lock()
+
+
+def _jobs() -> List[str]:
+    return [name.strip() for name in PROFILE_JOBS.split(',') if name.strip()]
+
+
+def arm(names: Optional[Iterable[str]] = None, runs: int = PROFILE_RUNS) -> None:
+    """Profile the next `runs` runs of `names` (every job when empty)."""
+    names = list(names or []) or [_ALL]
+    with _lock:
+        for name in names:
+            _armed[name] = runs
+    logger.info("[profiling] Profiling the next %d runs of %s, dumps go to %s",
+                runs, ', '.join(names), PROFILE_DIR)
+
+
+def _take(name: str) -> bool:
+    with _lock:
+        for key in (name, _ALL):
+            if _armed.get(key, 0) > 0:
+                _armed[key] -= 1
+                return True
+    return False
+
+
+def install() -> None:
+    """Arm PROFILE_JOBS now and on every SIGUSR1.
+
+    start.sh execs python, so `docker kill -s USR1 iot-fetcher` reaches it;
+    `docker exec iot-fetcher pkill -USR1 -f main.py` works as well.
+    """
+    if _jobs():
+        arm(_jobs())
+    try:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: arm(_jobs()))
+    except (AttributeError, ValueError) as e:
+        logger.debug("[profiling] Unable to install SIGUSR1 handler: %s", e)
+
+
+def _start_tracing() -> tracemalloc.Snapshot:
+    global _tracing
+    with _lock:
+        if _tracing == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracing += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracing() -> None:
+    global _tracing
+    with _lock:
+        _tracing -= 1
+        if _tracing == 0:
+            tracemalloc.stop()
+
+
+def _dump(name: str, profile: cProfile.Profile, before: tracemalloc.Snapshot,
+          after: tracemalloc.Snapshot, peak: int, seconds: float) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    profile.dump_stats(f"{base}.prof")
+
+    out = io.StringIO()
+    out.write(f"{name}: {seconds:.2f}s wall, tracemalloc peak {peak / 1e6:.1f} MB\n\n")
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+    out.write(f"\nTop {PROFILE_TOP} allocations during the run:\n")
+    for stat in after.compare_to(before, 'lineno')[:PROFILE_TOP]:
+        out.write(f"{stat}\n")
+    with open(f"{base}.txt", 'w') as f:
+        f.write(out.getvalue())
+    logger.info("[profiling] Wrote %s.prof and %s.txt", base, base)
+
+
+@contextlib.contextmanager
+def _profiled(name: str):
+    """One profiled run: cProfile on the calling thread plus tracemalloc.
+
+    Runs are profiled one at a time; one armed while another is being
+    profiled runs unprofiled.
+    """
+    if not _active.acquire(blocking=False):
+        logger.info("[profiling] Another run is being profiled, running %s unprofiled", name)
+        yield
+        return
+
+    with contextlib.ExitStack() as cleanup:
+        cleanup.callback(_active.release)
+        before = _start_tracing()
+        cleanup.callback(_stop_tracing)
+        started = time.perf_counter()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) is active.
+            logger.warning("[profiling] Unable to profile %s: %s", name, e)
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            seconds = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            try:
+                _dump(name, profile, before, after, peak, seconds)
+            except OSError as e:
+                logger.warning("[profiling] Unable to write profile of %s: %s", name, e)
+
+
+def wrap(func: JobFunc) -> JobFunc:
+    """Wrap a collector so armed runs are profiled; unarmed runs pay one dict lookup.
+
+    Sync collectors are profiled on their worker thread. For async ones the
+    profile covers the event loop thread, so concurrent coroutines show up too.
+    """
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def run_async():
+            if not _take(name):
+                return await func()
+            with _profiled(name):
+                return await func()
+        return run_async
+
+    @functools.wraps(func)
+    def run():
+        if not _take(name):
+            return func()
+        with _profiled(name):
+            return func()
+    return run
@@ -0,0 +1,533 @@
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import schedule
+
+import metrics
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# Upper bound on sync collectors (aquatemp, deco, eufy, ...) running at the
+# same time. Async collectors run on the event loop and don't count.
+SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', '4'))
+
+# Long, heavy jobs (backup_vm, eufy_snapshot, elpris) get their own lane so
+# they never hold a slot the minute-level pollers need. Their threads run at
+# a lower CPU priority; on Linux the IO priority follows the nice value.
+HEAVY_WORKERS = int(os.environ.get('HEAVY_WORKERS', '2'))
+HEAVY_NICE = int(os.environ.get('HEAVY_NICE', '10'))
+
+# Startup: every collector runs once, concurrently, each after a random delay
+# of up to WARM_START_JITTER seconds and at most WARM_START_CONCURRENCY at a time.
+WARM_START_CONCURRENCY = int(os.environ.get('WARM_START_CONCURRENCY', '4'))
+WARM_START_JITTER = float(os.environ.get('WARM_START_JITTER', '5'))
+
+# Last run/success per job survives restarts here, so a restart only runs
+# the jobs that are actually due instead of everything.
+FETCHER_STATE_DIR = os.environ.get('FETCHER_STATE_DIR', '/tmp/iot-fetcher')
+STATE_FILE = os.path.join(FETCHER_STATE_DIR, 'scheduler.json')
+
+_PERSISTED = ('last_run', 'last_success', 'last_status', 'last_duration')
+
+# Interval jobs run on multiples of their interval since the epoch (every 5
+# minutes: :00, :05, ...) instead of drifting a little every run, and points
+# a run writes without a timestamp are stamped with its slot, so series of
+# different collectors line up. 0 keeps schedule's own timing.
+ALIGN_RUNS = os.environ.get('ALIGN_RUNS', '1') != '0'
+
+JobFunc = Callable[[], Union[None, Awaitable[None]]]
+
+
+class JobTimeout(TimeoutError):
+    """Raised by a job wrapper (e.g. worker.proxy) that gave up on a run after its own deadline."""
+
+
+@dataclass
+class JobState:
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    last_run: Optional[float] = None
+    last_success: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_status: Optional[str] = None  # 'ok' | 'error' | 'timeout'
+    points: int = 0
+    run_points: int = 0
+    first_point_at: Optional[float] = None
+    # Fingerprint of the values written by the current and the previous run.
+    run_digest: int = 0
+    last_digest: Optional[int] = None
+    changed: Optional[bool] = None
+
+
+class Lane:
+    def __init__(self, workers: int, nice: int = 0):
+        self.workers = workers
+        self.nice = nice
+        self.slots = asyncio.Semaphore(workers)
+
+
+LANES: Dict[str, Lane] = {
+    'default': Lane(SCHEDULER_WORKERS),
+    'heavy': Lane(HEAVY_WORKERS, nice=HEAVY_NICE),
+}
+
+_states: Dict[str, JobState] = {}
+
+RUN_DURATION = metrics.Histogram('fetcher_collector_run_duration_seconds',
+                                 'Wall time of collector runs.', ['collector', 'status'])
+RUNS = metrics.Counter('fetcher_collector_runs_total', 'Collector runs by outcome.', ['collector', 'status'])
+TIMEOUTS = metrics.Counter('fetcher_collector_timeouts_total', 'Collector runs abandoned after a timeout.', ['collector'])
+ERRORS = metrics.Counter('fetcher_collector_errors_total', 'Collector runs that raised or logged an error.',
+                         ['collector'])
+LAST_SUCCESS = metrics.Gauge('fetcher_collector_last_success_timestamp_seconds',
+                             'Unix time of the last successful run.', ['collector'])
+POINTS = metrics.Counter('fetcher_collector_points_total', 'Points written on behalf of a collector.', ['collector'])
+RUNNING = metrics.Gauge('fetcher_collector_running', 'Whether a run of the collector is in flight.', ['collector'])
+LAST_TICK = metrics.Gauge('fetcher_scheduler_last_tick_timestamp_seconds', 'Unix time of the last scheduler tick.')
+
+# Called on the loop after every run with the job name and its state.
+_listeners: List[Callable[[str, JobState], None]] = []
+
+# Name of the job whose code is currently running; copied into worker threads
+# and `asyncio.to_thread` calls so writers can attribute points to a job.
+current_job: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_job', default=None)
+
+# Unix time (seconds) of the slot the current run belongs to, copied along
+# with current_job. The writer stamps points lacking a timestamp with it.
+collection_time: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar('collection_time', default=None)
+
+# Messages of the ERROR records logged by the current run. Most collectors
+# catch, log and swallow their failures; logging an error fails the run just
+# like raising does. Shared with the run's threads and tasks like current_job.
+run_errors: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar('run_errors', default=None)
+
+# In-flight task per job name, so a slow run is never started twice.
+_running: Dict[str, asyncio.Task] = {}
+
+# Threads of sync runs that were abandoned after a timeout. Python can't kill
+# a thread, so it is left to finish (or hang) in the background as a daemon;
+# the job is not started again while it is still alive, which caps the leak
+# at one thread per job.
+_abandoned: Dict[str, threading.Thread] = {}
+
+# Aligned jobs that ran since the last tick; schedule reschedules them
+# relative to now, they are moved back onto their grid after the tick.
+_ran: List[schedule.Job] = []
+
+
+def job_state(name: str) -> JobState:
+    return _states.setdefault(name, JobState())
+
+
+def job_states() -> Dict[str, JobState]:
+    return dict(_states)
+
+
+def add_listener(callback: Callable[[str, JobState], None]) -> None:
+    _listeners.append(callback)
+
+
+class _ErrorCapture(logging.Handler):
+    """Root handler appending ERROR records to the list of the run they were logged from."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        errors = run_errors.get()
+        if errors is None:
+            return
+        try:
+            errors.append(record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+
+_error_capture = _ErrorCapture()
+
+
+@contextlib.contextmanager
+def capture_errors() -> Iterator[List[str]]:
+    """Collect the ERROR records logged inside the block, including from threads and tasks it starts."""
+    root = logging.getLogger()
+    # Added on first use, so logging.basicConfig() still configures the root logger.
+    if _error_capture not in root.handlers:
+        root.addHandler(_error_capture)
+    errors: List[str] = []
+    token = run_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        run_errors.reset(token)
+
+
+def describe_errors(errors: List[str]) -> str:
+    first = errors[0].splitlines()[0] if errors[0] else ''
+    return f"logged {len(errors)} error(s), first: {first[:200]}"
+
+
+def record_points(count: int, digest: int = 0) -> None:
+    """Attribute `count` written points to the job currently running, if any."""
+    name = current_job.get()
+    if name is None or count <= 0:
+        return
+    state = job_state(name)
+    state.points += count
+    state.run_points += count
+    POINTS.inc(count, collector=name)
+    state.run_digest ^= digest
+    if state.first_point_at is None:
+        state.first_point_at = time.time()
+
+
+def load_state(path: str = STATE_FILE) -> int:
+    """Restore persisted job state. Returns the number of jobs restored."""
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        logger.warning("[scheduler] Ignoring unreadable state file %s: %s", path, e)
+        return 0
+
+    for name, values in saved.items():
+        state = job_state(name)
+        for key in _PERSISTED:
+            if key in values:
+                setattr(state, key, values[key])
+    logger.info("[scheduler] Restored state of %d jobs from %s", len(saved), path)
+    return len(saved)
+
+
+def save_state(path: str = STATE_FILE) -> None:
+    saved = {name: {key: getattr(state, key) for key in _PERSISTED}
+             for name, state in _states.items() if state.last_run is not None}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(saved, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("[scheduler] Unable to save state to %s: %s", path, e)
+
+
+def _last_slot(j: schedule.Job, now: datetime.datetime) -> Optional[datetime.datetime]:
+    """Most recent wall-clock slot of a job pinned with `.at(...)`, e.g. today 14:03.
+
+    Only meaningful for `every().day.at(...)` / `every().hour.at(...)` style
+    jobs; `every(3).hours.at(...)` is anchored to the start time, not the clock.
+    """
+    if j.at_time is None or j.interval != 1 or j.unit not in ('days', 'hours', 'minutes'):
+        return None
+    at = j.at_time
+    if j.unit == 'days':
+        slot = now.replace(hour=at.hour, minute=at.minute, second=at.second, microsecond=0)
+    elif j.unit == 'hours':
+        slot = now.replace(minute=at.minute, second=at.second, microsecond=0)
+    else:
+        slot = now.replace(second=at.second, microsecond=0)
+    if slot > now:
+        slot -= datetime.timedelta(**{j.unit: 1})
+    return slot
+
+
+def resume(j: schedule.Job) -> Optional[bool]:
+    """Carry a job's cadence over from its persisted last run.
+
+    Returns True when the job should run now: it is due or overdue, or its
+    last run failed or timed out. Returns False when it ran recently enough,
+    after pushing its next run out accordingly, and None when there is no
+    history for it.
+    """
+    name = j.job_func.__name__
+    state = _states.get(name)
+    if state is None or state.last_run is None:
+        return None
+
+    now = datetime.datetime.now()
+    last_run = datetime.datetime.fromtimestamp(state.last_run)
+    j.last_run = last_run
+    if state.last_status != 'ok':
+        # Its last run failed or timed out; don't wait a whole period to retry.
+        logger.info("[scheduler] %s last ran %s (%s), running it now",
+                    name, last_run.strftime('%Y-%m-%d %H:%M'), state.last_status or 'unknown status')
+        return True
+    slot = _last_slot(j, now)
+    if slot is not None:
+        if last_run < slot:
+            return True
+    else:
+        next_run = last_run + datetime.timedelta(**{j.unit: j.interval})
+        if next_run <= now:
+            return True
+        j.next_run = min(j.next_run, next_run)
+    logger.info("[scheduler] %s last ran %s, next run at %s",
+                name, last_run.strftime('%Y-%m-%d %H:%M'), j.next_run.strftime('%Y-%m-%d %H:%M'))
+    return False
+
+
+def _period(j: schedule.Job) -> Optional[float]:
+    """Interval of a plain interval job in seconds, None for jobs pinned with `.at(...)`."""
+    if j.at_time is not None or j.unit not in ('seconds', 'minutes', 'hours', 'days'):
+        return None
+    return datetime.timedelta(**{j.unit: j.interval}).total_seconds()
+
+
+def _slot(j: schedule.Job, now: float) -> int:
+    """The grid slot a run of `j` starting at `now` belongs to."""
+    period = _period(j)
+    if period:
+        return int(now // period * period)
+    # Pinned jobs: the time they were due, unless started early (warm start).
+    if j.next_run is not None and j.next_run.timestamp() <= now:
+        return int(j.next_run.timestamp())
+    return int(now)
+
+
+def snap(j: schedule.Job) -> None:
+    """Move the next run of an interval job to the next slot of its grid."""
+    period = _period(j)
+    if not ALIGN_RUNS or period is None:
+        return
+    j.next_run = datetime.datetime.fromtimestamp((time.time() // period + 1) * period)
+
+
+def align(j: schedule.Job) -> None:
+    """Run `j` on its wall-clock grid and stamp its points with the slot of each run."""
+    if not ALIGN_RUNS:
+        return
+    func = j.job_func
+
+    def aligned():
+        token = collection_time.set(_slot(j, time.time()))
+        try:
+            # The task created for the run copies the context, slot included.
+            return func()
+        finally:
+            collection_time.reset(token)
+            _ran.append(j)
+    aligned.__name__ = func.__name__
+    j.job_func = aligned
+    snap(j)
+
+
+def _lower_priority(nice: int) -> None:
+    """Renice the calling thread (Linux treats threads as tasks with their own nice)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except (AttributeError, OSError) as e:
+        logger.debug("[scheduler] Unable to renice worker thread: %s", e)
+
+
+async def _run_in_thread(func: Callable[[], None], nice: int = 0) -> None:
+    """Run `func` in a fresh daemon thread and await it without blocking the loop.
+
+    Cancelling the await (e.g. from `asyncio.timeout`) returns immediately
+    and abandons the thread instead of waiting for it to finish.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(exc: Optional[BaseException]) -> None:
+        if future.done():
+            return
+        if exc is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exc)
+
+    def target() -> None:
+        if nice:
+            _lower_priority(nice)
+        try:
+            func()
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, e)
+        else:
+            loop.call_soon_threadsafe(resolve, None)
+
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(target,),
+                              name=f"collector-{func.__name__}", daemon=True)
+    thread.start()
+    try:
+        await future
+    except asyncio.CancelledError:
+        _abandoned[func.__name__] = thread
+        raise
+
+
+async def run_job(func: JobFunc, timeout_seconds: Optional[float] = 120, lane: str = 'default') -> None:
+    """Run one collector to completion on the current event loop.
+
+    Coroutine functions are awaited directly and cancelled on timeout; plain
+    functions run in a worker thread that is abandoned on timeout. Either way
+    the job is recorded as timed out and the scheduler carries on. Sync
+    functions first wait for a free slot in their lane; the timeout only
+    starts once the job is actually running.
+    """
+    name = func.__name__
+    state = job_state(name)
+    if inspect.iscoroutinefunction(func):
+        await _timed_run(func, state, timeout_seconds)
+        return
+    worker_lane = LANES[lane]
+    async with worker_lane.slots:
+        await _timed_run(func, state, timeout_seconds, worker_lane.nice)
+
+
+def _record_error(name: str, state: JobState, reason: str) -> None:
+    state.failures += 1
+    state.last_status = 'error'
+    ERRORS.inc(collector=name)
+    logger.error("[scheduler] %s failed: %s", name, reason)
+
+
+async def _timed_run(func: JobFunc, state: JobState, timeout_seconds: Optional[float], nice: int = 0) -> None:
+    name = func.__name__
+    state.runs += 1
+    state.last_run = time.time()
+    state.run_digest = 0
+    state.run_points = 0
+    started = time.monotonic()
+    token = current_job.set(name)
+    RUNNING.set(1, collector=name)
+    deadline = asyncio.timeout(timeout_seconds)
+    try:
+        with capture_errors() as errors:
+            async with deadline:
+                if inspect.iscoroutinefunction(func):
+                    await func()
+                else:
+                    await _run_in_thread(func, nice)
+    except Exception as e:
+        # A TimeoutError the collector raised itself (socket, requests) is a
+        # failure like any other; only an expired deadline is a timeout.
+        if isinstance(e, JobTimeout) or (isinstance(e, TimeoutError) and deadline.expired()):
+            state.timeouts += 1
+            state.last_status = 'timeout'
+            TIMEOUTS.inc(collector=name)
+            logger.error("[scheduler] %s timed out after %ds, abandoning it", name, timeout_seconds)
+        else:
+            _record_error(name, state, str(e))
+    else:
+        if errors:
+            _record_error(name, state, describe_errors(errors))
+        else:
+            state.last_success = time.time()
+            state.last_status = 'ok'
+            LAST_SUCCESS.set(state.last_success, collector=name)
+            state.changed = state.last_digest is not None and state.run_digest != state.last_digest
+            state.last_digest = state.run_digest
+            logger.debug("[scheduler] %s finished in %.1fs", name, time.monotonic() - started)
+    finally:
+        current_job.reset(token)
+        state.last_duration = time.monotonic() - started
+        RUNNING.set(0, collector=name)
+
+    RUN_DURATION.observe(state.last_duration, collector=name, status=state.last_status)
+    RUNS.inc(collector=name, status=state.last_status)
+    for callback in _listeners:
+        try:
+            callback(name, state)
+        except Exception:
+            logger.exception("[scheduler] Listener failed after %s", name)
+
+
+def job(func: JobFunc, timeout_seconds: float = 120, lane: str = 'default') -> Callable[[], None]:
+    """Wrap a collector for `schedule`: each due run becomes a task on the loop.
+
+    The returned callable returns immediately, so `schedule.run_pending()`
+    never waits on a collector and independent collectors run concurrently.
+    It returns the started task, or None when the run was skipped.
+    """
+    def spawn() -> Optional[asyncio.Task]:
+        name = func.__name__
+        task = _running.get(name)
+        if task is not None and not task.done():
+            logger.warning("[scheduler] %s is still running, skipping this run", name)
+            return None
+        hung = _abandoned.get(name)
+        if hung is not None:
+            if hung.is_alive():
+                logger.warning("[scheduler] %s is still hung from a timed out run, skipping this run", name)
+                return None
+            del _abandoned[name]
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(run_job(func, timeout_seconds, lane), name=name)
+        _running[name] = task
+        return task
+    spawn.__name__ = func.__name__
+    return spawn
+
+
+async def warm_start(jobs: Iterable[schedule.Job],
+                     concurrency: int = WARM_START_CONCURRENCY,
+                     jitter: float = WARM_START_JITTER) -> None:
+    """Run every job once, concurrently, and log each collector's time-to-first-point.
+
+    Jobs registered more than once (e.g. elpris) only run once. Meant to be
+    started as a background task so `run_forever` ticks meanwhile.
+    """
+    started = time.time()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    unique: Dict[str, schedule.Job] = {}
+    for j in jobs:
+        unique.setdefault(j.job_func.__name__, j)
+
+    async def start(j: schedule.Job) -> None:
+        await asyncio.sleep(random.uniform(0, jitter))
+        async with slots:
+            task = j.run()
+            if task is not None:
+                await asyncio.gather(task, return_exceptions=True)
+
+    logger.info("[scheduler] Warm start: %d jobs, concurrency %d, jitter %.0fs",
+                len(unique), concurrency, jitter)
+    await asyncio.gather(*(start(j) for j in unique.values()))
+
+    for name in unique:
+        state = job_state(name)
+        if state.first_point_at is not None:
+            logger.info("[scheduler] Warm start: %s first point after %.1fs",
+                        name, state.first_point_at - started)
+        else:
+            logger.info("[scheduler] Warm start: %s produced no points (%s)",
+                        name, state.last_status or 'not run')
+    logger.info("[scheduler] Warm start completed in %.1fs", time.time() - started)
+
+
+async def run_forever() -> None:
+    """Tick `schedule` once a second until cancelled."""
+    while True:
+        try:
+            schedule.run_pending()
+        except Exception as e:
+            logger.info(f"An error occurred: {e}")
+        while _ran:
+            snap(_ran.pop())
+        LAST_TICK.set(time.time())
+        await asyncio.sleep(1)
+
+
+async def shutdown() -> None:
+    """Cancel in-flight collectors. Worker threads are daemons and die with the process."""
+    tasks = [t for t in _running.values() if not t.done()]
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
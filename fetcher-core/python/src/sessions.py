@@ -0,0 +1,145 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+import metrics
+from scheduler import FETCHER_STATE_DIR
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# Login sessions of the integrations (tokens, shared keys, resolved API
+# domains) kept across runs and restarts, so collectors don't log in every
+# cycle. The file is encrypted with a key derived from the SESSION_STORE_KEY
+# passphrase (scrypt, with a random salt kept in SESSION_STORE_FILE.salt), or
+# with a key generated into SESSION_STORE_FILE.key when that is not set,
+# which only helps as long as the two files are not copied together.
+SESSION_STORE_FILE = os.environ.get('SESSION_STORE_FILE', os.path.join(FETCHER_STATE_DIR, 'sessions.bin'))
+SESSION_STORE_KEY = os.environ.get('SESSION_STORE_KEY', '')
+
+# Sessions are treated as expired this long before they actually expire, so
+# the next run logs in again while the old token still works.
+SESSION_REFRESH_SECONDS = float(os.environ.get('SESSION_REFRESH_SECONDS', '600'))
+
+# scrypt cost of deriving the key from SESSION_STORE_KEY, once per process.
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+REUSED = metrics.Counter('fetcher_sessions_reused_total', 'Runs that reused a stored session.', ['integration'])
+SAVED = metrics.Counter('fetcher_sessions_saved_total', 'Sessions stored after a login.', ['integration'])
+
+_lock = threading.Lock()
+_entries: Dict[str, Dict[str, Any]] = {}
+_mtime: Optional[float] = None
+_fernet: Optional[Fernet] = None
+
+
+def _read_or_create(path: str, create: Callable[[], bytes]) -> bytes:
+    """The contents of `path`, first written (mode 0600) with `create()` when it does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    data = create()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another process (a collector worker) got there first.
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def _key() -> bytes:
+    if SESSION_STORE_KEY:
+        salt = _read_or_create(f"{SESSION_STORE_FILE}.salt", lambda: os.urandom(16).hex().encode())
+        derived = hashlib.scrypt(SESSION_STORE_KEY.encode(), salt=bytes.fromhex(salt.decode()),
+                                 n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+        return base64.urlsafe_b64encode(derived)
+    logger.warning("[sessions] SESSION_STORE_KEY not set, the session store key is kept next to it in %s.key",
+                   SESSION_STORE_FILE)
+    return _read_or_create(f"{SESSION_STORE_FILE}.key", Fernet.generate_key)
+
+
+def _cipher() -> Fernet:
+    global _fernet
+    if _fernet is None:
+        _fernet = Fernet(_key())
+    return _fernet
+
+
+def _load() -> None:
+    """Re-read the store when another process (a collector worker) changed it."""
+    global _entries, _mtime
+    try:
+        mtime = os.path.getmtime(SESSION_STORE_FILE)
+    except OSError:
+        return
+    if mtime == _mtime:
+        return
+    _mtime = mtime
+    try:
+        with open(SESSION_STORE_FILE, 'rb') as f:
+            _entries = json.loads(_cipher().decrypt(f.read()))
+    except (OSError, ValueError, InvalidToken) as e:
+        logger.warning("[sessions] Ignoring unreadable session store %s: %s", SESSION_STORE_FILE, e)
+        _entries = {}
+
+
+def _save() -> None:
+    global _mtime
+    try:
+        os.makedirs(os.path.dirname(SESSION_STORE_FILE), exist_ok=True)
+        tmp = f"{SESSION_STORE_FILE}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_cipher().encrypt(json.dumps(_entries).encode()))
+        os.replace(tmp, SESSION_STORE_FILE)
+        _mtime = os.path.getmtime(SESSION_STORE_FILE)
+    except OSError as e:
+        logger.warning("[sessions] Unable to save session store %s: %s", SESSION_STORE_FILE, e)
+
+
+def get(integration: str, account: str) -> Optional[Dict[str, Any]]:
+    """The stored session of `account`, or None when there is none or it is about to expire."""
+    with _lock:
+        _load()
+        entry = _entries.get(f"{integration}:{account}")
+    if entry is None:
+        return None
+    expires_at = entry.get('expires_at')
+    if expires_at is not None and expires_at - SESSION_REFRESH_SECONDS <= time.time():
+        logger.info("[sessions] %s session expires at %s, renewing it", integration,
+                    time.strftime('%Y-%m-%d %H:%M', time.localtime(expires_at)))
+        return None
+    REUSED.inc(integration=integration)
+    return entry['data']
+
+
+def put(integration: str, account: str, data: Dict[str, Any], expires_at: Optional[float]) -> None:
+    """Store a session after logging in. `expires_at` is a unix time, None when unknown."""
+    with _lock:
+        _load()
+        _entries[f"{integration}:{account}"] = {'data': data, 'expires_at': expires_at, 'saved_at': time.time()}
+        _save()
+    SAVED.inc(integration=integration)
+
+
+def drop(integration: str, account: str) -> None:
+    """Forget a session the service rejected."""
+    with _lock:
+        _load()
+        if _entries.pop(f"{integration}:{account}", None) is not None:
+            _save()
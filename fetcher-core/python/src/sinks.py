@@ -0,0 +1,293 @@
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for INFLUX_COMPRESSION=zstd
+    zstandard = None
+
+import lineprotocol
+import metrics
+from scheduler import FETCHER_STATE_DIR
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# InfluxDB v3 Cloud configuration
+influx_host = os.environ.get('INFLUX_HOST', '')
+influx_token = os.environ.get('INFLUX_TOKEN', '')
+influx_database = os.environ.get('INFLUX_DATABASE', 'irisgatan')
+
+# Where points are written, comma separated; every sink gets all points with
+# its own batching, spool and retries. Entries are kind[=target]:
+#   influx           v2 write endpoint of INFLUX_HOST (default)
+#   vm-influx[=url]  VictoriaMetrics /influx/write, line protocol
+#   vm-import[=url]  VictoriaMetrics /api/v1/import, JSON lines
+#   file[=path]      append line protocol to a local file
+#   stdout           print line protocol, for dry runs of a collector
+# The VictoriaMetrics sinks default to INFLUX_HOST and send INFLUX_TOKEN as a
+# bearer token, like backup_vm.
+INFLUX_SINKS = os.environ.get('INFLUX_SINKS', 'influx')
+
+# Keep-alive connections kept open per HTTP sink, shared by all collectors
+# and threads, and the timeout of one write request.
+INFLUX_POOL_SIZE = int(os.environ.get('INFLUX_POOL_SIZE', '4'))
+INFLUX_TIMEOUT = float(os.environ.get('INFLUX_TIMEOUT', '30'))
+
+# Request bodies of at least INFLUX_COMPRESS_MIN_BYTES are compressed with
+# INFLUX_COMPRESSION: 'gzip' (InfluxDB and VictoriaMetrics), 'zstd'
+# (VictoriaMetrics only, needs the zstandard package) or 'none'.
+INFLUX_COMPRESSION = os.environ.get('INFLUX_COMPRESSION', 'gzip')
+INFLUX_COMPRESS_MIN_BYTES = int(os.environ.get('INFLUX_COMPRESS_MIN_BYTES', '1024'))
+
+DEFAULT_FILE = os.path.join(FETCHER_STATE_DIR, 'points.lp')
+
+WRITE_REQUESTS = metrics.Counter('fetcher_influx_write_requests_total', 'Write requests sent, by sink.', ['sink'])
+CONNECTIONS = metrics.Counter('fetcher_influx_connections_opened_total',
+                              'New connections per sink; requests minus this were served on a kept-alive one.',
+                              ['sink'])
+WIRE_BYTES = metrics.Counter('fetcher_influx_wire_bytes_total', 'Request body bytes sent, after compression.', ['sink'])
+COMPRESS_IN = metrics.Counter('fetcher_influx_compress_input_bytes_total', 'Bytes fed to the compressor.', ['encoding'])
+COMPRESS_OUT = metrics.Counter('fetcher_influx_compress_output_bytes_total', 'Bytes out of the compressor.', ['encoding'])
+COMPRESS_CPU = metrics.Counter('fetcher_influx_compress_cpu_seconds_total', 'CPU time spent compressing.', ['encoding'])
+CLIENT_REBUILDS = metrics.Counter('fetcher_influx_client_rebuilds_total',
+                                  'HTTP sessions rebuilt after a connection error.', ['sink'])
+
+
+class WriteError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"HTTP {status}: {body}")
+        self.status = status
+
+
+def _encoding() -> Optional[str]:
+    if INFLUX_COMPRESSION == 'zstd' and zstandard is None:
+        logger.warning("[sinks] INFLUX_COMPRESSION=zstd needs the zstandard package, using gzip")
+        return 'gzip'
+    if INFLUX_COMPRESSION in ('gzip', 'zstd'):
+        return INFLUX_COMPRESSION
+    return None
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    started = time.thread_time()
+    if encoding == 'zstd':
+        out = zstandard.ZstdCompressor(level=3).compress(body)
+    else:
+        out = gzip.compress(body, compresslevel=6, mtime=0)
+    COMPRESS_CPU.inc(time.thread_time() - started, encoding=encoding)
+    COMPRESS_IN.inc(len(body), encoding=encoding)
+    COMPRESS_OUT.inc(len(out), encoding=encoding)
+    return out
+
+
+class Sink:
+    """A destination for line protocol batches. write() raises when the batch was not stored."""
+
+    # Failed batches are spooled to disk and replayed; pointless for local sinks.
+    remote = False
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def write(self, lines: List[str]) -> None:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """Called after a connection-level failure."""
+
+    def close(self) -> None:
+        pass
+
+
+class _HttpSink(Sink):
+    """Keep-alive session posting batches to one endpoint."""
+
+    remote = True
+    content_type = 'text/plain; charset=utf-8'
+
+    def __init__(self, name: str, host: str, path: str, auth: str, params: Optional[dict] = None):
+        super().__init__(name)
+        if '://' not in host:
+            host = f"https://{host}"
+        self.url = f"{host.rstrip('/')}{path}"
+        self.params = params
+        self.auth = auth
+        self.encoding = _encoding()
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self) -> None:
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=INFLUX_POOL_SIZE, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.session.headers.update({'Content-Type': self.content_type})
+        if self.auth:
+            self.session.headers['Authorization'] = self.auth
+        self._connections = 0
+
+    def body(self, lines: List[str]) -> bytes:
+        return '\n'.join(lines).encode()
+
+    def write(self, lines: List[str]) -> None:
+        body = self.body(lines)
+        if not body:
+            return
+        headers = None
+        if self.encoding is not None and len(body) >= INFLUX_COMPRESS_MIN_BYTES:
+            body = _compress(body, self.encoding)
+            headers = {'Content-Encoding': self.encoding}
+        WIRE_BYTES.inc(len(body), sink=self.name)
+        session, adapter = self.session, self.adapter
+        try:
+            response = session.post(self.url, params=self.params, data=body, headers=headers,
+                                    timeout=INFLUX_TIMEOUT)
+        finally:
+            WRITE_REQUESTS.inc(sink=self.name)
+            self._count_connections(adapter)
+        if response.status_code >= 300:
+            raise WriteError(response.status_code, response.text[:200])
+
+    def _count_connections(self, adapter: HTTPAdapter) -> None:
+        pools = adapter.poolmanager.pools
+        opened = sum(pools[key].num_connections for key in pools.keys())
+        with self._lock:
+            if adapter is self.adapter and opened > self._connections:
+                CONNECTIONS.inc(opened - self._connections, sink=self.name)
+                self._connections = opened
+
+    def reset(self) -> None:
+        with self._lock:
+            old = self.session
+            self._connect()
+        CLIENT_REBUILDS.inc(sink=self.name)
+        old.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _number(raw: str) -> Optional[float]:
+    """A line protocol field value as a sample value; None for strings."""
+    if raw.startswith('"'):
+        return None
+    if raw[-1] in 'iu':
+        return int(raw[:-1])
+    if raw in ('t', 'T', 'true', 'True', 'TRUE'):
+        return 1
+    if raw in ('f', 'F', 'false', 'False', 'FALSE'):
+        return 0
+    return float(raw)
+
+
+class _VMImportSink(_HttpSink):
+    """VictoriaMetrics JSON line import, one series per field named `{measurement}_{field}`.
+
+    Same naming VictoriaMetrics applies to line protocol, so both VM sinks
+    produce identical series. String fields have no numeric value and are skipped.
+    """
+
+    content_type = 'application/json'
+
+    def body(self, lines: List[str]) -> bytes:
+        now_ms = int(time.time() * 1000)
+        out = []
+        for line in lines:
+            parsed = lineprotocol.split(line)
+            if parsed is None:
+                continue
+            series, fields, timestamped = parsed
+            measurement, tags = lineprotocol.split_series(series)
+            measurement = lineprotocol.unescape(measurement)
+            labels = {lineprotocol.unescape(k): lineprotocol.unescape(v) for k, v in tags}
+            ts = int(line.rsplit(' ', 1)[1]) * 1000 if timestamped else now_ms
+            for key, raw in fields:
+                try:
+                    value = _number(raw)
+                except ValueError:
+                    value = None
+                if value is None:
+                    continue
+                metric = dict(labels, __name__=f"{measurement}_{lineprotocol.unescape(key)}")
+                out.append(json.dumps({'metric': metric, 'values': [value], 'timestamps': [ts]},
+                                      separators=(',', ':')))
+        return '\n'.join(out).encode()
+
+
+class _FileSink(Sink):
+    def __init__(self, name: str, path: str):
+        super().__init__(name)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, lines: List[str]) -> None:
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+
+
+class _StdoutSink(Sink):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lock = threading.Lock()
+
+    def write(self, lines: List[str]) -> None:
+        with self._lock:
+            sys.stdout.write('\n'.join(lines) + '\n')
+            sys.stdout.flush()
+
+
+def _build(kind: str, target: str) -> Optional[Sink]:
+    if kind == 'influx':
+        host = target or influx_host
+        if not host or not influx_token:
+            logger.error("[sinks] INFLUX_HOST and INFLUX_TOKEN must be configured for v3 Cloud")
+            return None
+        return _HttpSink(kind, host, '/api/v2/write', f"Token {influx_token}",
+                         {'bucket': influx_database, 'precision': 's'})
+    if kind in ('vm-influx', 'vm-import'):
+        host = target or influx_host
+        if not host:
+            logger.error("[sinks] %s needs a URL or INFLUX_HOST", kind)
+            return None
+        auth = f"Bearer {influx_token}" if influx_token else ''
+        if kind == 'vm-influx':
+            return _HttpSink(kind, host, '/influx/write', auth, {'precision': 's'})
+        return _VMImportSink(kind, host, '/api/v1/import', auth)
+    if kind == 'file':
+        return _FileSink(kind, target or DEFAULT_FILE)
+    if kind == 'stdout':
+        return _StdoutSink(kind)
+    logger.error("[sinks] Unknown sink %r in INFLUX_SINKS", kind)
+    return None
+
+
+def configured() -> List[Sink]:
+    """The sinks listed in INFLUX_SINKS that could be set up."""
+    sinks: List[Sink] = []
+    for item in filter(None, (x.strip() for x in INFLUX_SINKS.split(','))):
+        kind, _, target = item.partition('=')
+        sink = _build(kind.strip(), target.strip())
+        if sink is None:
+            continue
+        # Two sinks of one kind, e.g. two files, need distinct metric labels and spools.
+        names = {s.name for s in sinks}
+        n = 2
+        while sink.name in names:
+            sink.name = f"{kind.strip()}-{n}"
+            n += 1
+        sinks.append(sink)
+    return sinks
@@ -3,6 +3,8 @@ import requests
 import logging
 from typing import List, Dict, Any, Optional
 
+import http_pool
+
 from influx import write_influx, Point
 
 # Configure module-specific logger
@@ -26,7 +28,7 @@ def _sonos():
     url = f"http://{sonos_host}/zones"
     
     try:
-        response = requests.get(url, timeout=5)
+        response = http_pool.session('sonos').get(url, timeout=5)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         logger.error(f"[sonos] Failed to fetch zones from {url}: {e}")
@@ -0,0 +1,112 @@
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+
+class Spool:
+    """Bounded on-disk FIFO of line protocol batches.
+
+    Each batch is one segment file named by a sequence number, written to a
+    temp file and renamed so a crash never leaves half a segment behind.
+    When the spool grows past `max_bytes` the oldest segments are evicted.
+    """
+
+    SUFFIX = '.lp'
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._segments: List[Tuple[int, int]] = []  # (seq, bytes), oldest first
+        self._next_seq = 0
+        self._loaded = False
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}{self.SUFFIX}")
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                seq = int(name[:-len(self.SUFFIX)])
+                self._segments.append((seq, os.path.getsize(os.path.join(self.directory, name))))
+            except (ValueError, OSError):
+                continue
+        self._segments.sort()
+        if self._segments:
+            self._next_seq = self._segments[-1][0] + 1
+            logger.info("[spool] Found %d segments (%.1f MB) in %s",
+                        len(self._segments), self._size() / 1e6, self.directory)
+
+    def _size(self) -> int:
+        return sum(size for _, size in self._segments)
+
+    def stats(self) -> Tuple[int, int]:
+        """(segments, bytes) currently spooled."""
+        with self._lock:
+            self._load()
+            return len(self._segments), self._size()
+
+    def append(self, lines: List[str]) -> int:
+        """Store a batch. Returns the number of points evicted to stay under the cap."""
+        body = ('\n'.join(lines) + '\n').encode()
+        with self._lock:
+            self._load()
+            os.makedirs(self.directory, exist_ok=True)
+            seq = self._next_seq
+            self._next_seq += 1
+            tmp = self._path(seq) + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, self._path(seq))
+            self._segments.append((seq, len(body)))
+            return self._evict()
+
+    def _evict(self) -> int:
+        evicted = 0
+        while len(self._segments) > 1 and self._size() > self.max_bytes:
+            seq, _ = self._segments.pop(0)
+            try:
+                with open(self._path(seq), 'rb') as f:
+                    evicted += f.read().count(b'\n')
+                os.remove(self._path(seq))
+            except OSError as e:
+                logger.warning("[spool] Unable to evict segment %d: %s", seq, e)
+        if evicted:
+            logger.warning("[spool] Spool above %.0f MB, evicted %d oldest points",
+                           self.max_bytes / 1e6, evicted)
+        return evicted
+
+    def peek(self) -> Optional[Tuple[int, List[str]]]:
+        """The oldest segment as (seq, lines), or None when the spool is empty."""
+        with self._lock:
+            self._load()
+            while self._segments:
+                seq, _ = self._segments[0]
+                try:
+                    with open(self._path(seq)) as f:
+                        return seq, [line for line in f.read().split('\n') if line]
+                except OSError as e:
+                    logger.warning("[spool] Dropping unreadable segment %d: %s", seq, e)
+                    self._segments.pop(0)
+            return None
+
+    def remove(self, seq: int) -> None:
+        with self._lock:
+            self._segments = [(s, size) for s, size in self._segments if s != seq]
+            try:
+                os.remove(self._path(seq))
+            except FileNotFoundError:
+                pass
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 from tapo_cloud import tapo as tapo_cloud
@@ -7,28 +8,23 @@ from tapo_local import tapo as tapo_local
 logger = logging.getLogger(__name__)
 
 
-def tapo():
+async def tapo():
     """
     Main TAPO integration entry point.
 
-    Runs both cloud and local discovery methods:
+    Runs both cloud and local discovery methods concurrently on the
+    scheduler's event loop:
     - Cloud discovery: Gets device inventory from TP-Link cloud (tapo_cloud_* metrics)
     - Local discovery: Scans local network for devices with energy monitoring (tapo_* metrics)
     """
     logger.info("[tapo] Running TAPO integration (cloud + local discovery)")
 
-    # Run cloud-based discovery
-    try:
-        logger.debug("[tapo] Starting cloud discovery...")
-        tapo_cloud()
-    except Exception as e:
-        logger.error(f"[tapo] Cloud discovery failed: {e}")
-
-    # Run local network discovery
-    try:
-        logger.debug("[tapo] Starting local discovery...")
-        tapo_local()
-    except Exception as e:
-        logger.error(f"[tapo] Local discovery failed: {e}")
+    logger.debug("[tapo] Starting cloud and local discovery...")
+    cloud, local = await asyncio.gather(tapo_cloud(), tapo_local(), return_exceptions=True)
+
+    if isinstance(cloud, Exception):
+        logger.error(f"[tapo] Cloud discovery failed: {cloud}")
+    if isinstance(local, Exception):
+        logger.error(f"[tapo] Local discovery failed: {local}")
 
     logger.info("[tapo] TAPO integration completed")
@@ -57,14 +57,14 @@ tapo_email = strip_quote(os.environ.get('TAPO_EMAIL', ''))
 tapo_password = strip_quote(os.environ.get('TAPO_PASSWORD', ''))
 
 
-def tapo():
+async def tapo():
     if not tapo_email or not tapo_password:
         logger.error(
             "[tapo] TAPO_EMAIL and TAPO_PASSWORD environment variables must be set")
         return
     
     try:
-        asyncio.run(_tapo())
+        await _tapo()
     except Exception as e:
         logger.exception(f"[tapo] Failed to execute tapo module: {e}")
 
@@ -201,7 +201,7 @@ async def _tapo():
                 return
 
         if points:
-            write_influx(points)
+            await asyncio.to_thread(write_influx, points)
             logger.info(f"[tapo_cloud] Successfully wrote {len(points)} data points to InfluxDB")
         else:
             logger.warning("[tapo_cloud] No data points to write to InfluxDB")
@@ -0,0 +1,271 @@
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Optional
+
+import collectors
+import influx
+import metrics
+from collectors import Collector
+from scheduler import JobTimeout, capture_errors, describe_errors
+
+# Configure module-specific logger
+logger = logging.getLogger(__name__)
+
+# 'thread' runs collectors inside the scheduler process (default), 'process'
+# runs each collector group in its own supervised worker process so a leak
+# in a vendor library can only take that worker down.
+COLLECTOR_ISOLATION = os.environ.get('COLLECTOR_ISOLATION', 'thread')
+
+# Recycle a worker after this many runs, or once its RSS after a run exceeds
+# WORKER_RECYCLE_RSS_MB. A worker whose RSS passes WORKER_RSS_LIMIT_MB while
+# running is killed on the spot.
+WORKER_MAX_RUNS = int(os.environ.get('WORKER_MAX_RUNS', '100'))
+WORKER_RECYCLE_RSS_MB = float(os.environ.get('WORKER_RECYCLE_RSS_MB', '200'))
+WORKER_RSS_LIMIT_MB = float(os.environ.get('WORKER_RSS_LIMIT_MB', '400'))
+
+# Extra time the scheduler gives a proxied job on top of the collector's own
+# timeout, so the worker is killed here before the scheduler abandons it.
+KILL_GRACE_SECONDS = 10
+
+_POLL_SECONDS = 1.0
+
+WORKER_RUNS = metrics.Counter('fetcher_worker_runs_total', 'Runs completed by worker processes.', ['group'])
+WORKER_CPU = metrics.Counter('fetcher_worker_cpu_seconds_total', 'CPU time spent by worker processes.', ['group'])
+WORKER_RSS = metrics.Gauge('fetcher_worker_rss_bytes', 'Worker RSS after its last run.', ['group'])
+WORKER_RESTARTS = metrics.Counter('fetcher_worker_restarts_total', 'Worker processes stopped and recycled.', ['group'])
+
+
+def enabled() -> bool:
+    return COLLECTOR_ISOLATION == 'process'
+
+
+def rss_bytes(pid: int) -> int:
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class Worker:
+    """Parent-side handle for one worker process serving a collector group.
+
+    Runs are serialized per worker. Points produced in the worker come back
+    over the pipe as line protocol and are written from this process.
+
+    The process runs at one nice value for its lifetime, the lowest any of
+    its collectors' lanes asks for: raising the priority back between runs
+    needs CAP_SYS_NICE, so a group spanning lanes (eufy and the heavy
+    eufy_snapshot) runs all of them at the default priority.
+    """
+
+    def __init__(self, group: str, nice: int = 0):
+        self.group = group
+        self.nice = nice
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn: Optional[Connection] = None
+        self.runs = 0
+        self.cpu_seconds = 0.0
+        self.rss_bytes = 0
+        self.recycles = 0
+        self._lock = threading.Lock()
+
+    def _start(self) -> None:
+        ctx = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, self.group, self.nice),
+                                   name=f"worker-{self.group}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.runs = 0
+        logger.info("[worker] Started worker %s (pid %d)", self.group, self.process.pid)
+
+    def _stop(self, reason: str, kill: bool = False) -> None:
+        if self.process is None:
+            return
+        logger.info("[worker] Stopping worker %s (pid %d): %s", self.group, self.process.pid, reason)
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(('stop',))
+            except (OSError, ValueError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+        self.conn = None
+        self.recycles += 1
+        WORKER_RESTARTS.inc(group=self.group)
+
+    def run(self, name: str, timeout_seconds: Optional[float]) -> None:
+        """Run collector `name` in the worker, blocking until it finishes.
+
+        Raises JobTimeout (after killing the worker) when the run takes
+        longer than `timeout_seconds`, RuntimeError when the collector or
+        the worker fails.
+        """
+        with self._lock:
+            if self.process is None or not self.process.is_alive():
+                if self.process is not None:
+                    self._stop("process died", kill=True)
+                self._start()
+
+            self.conn.send(('run', name))
+            deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+            while True:
+                wait = _POLL_SECONDS
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stop(f"{name} timed out after {timeout_seconds:.0f}s", kill=True)
+                        raise JobTimeout(f"{name} timed out in worker {self.group}")
+                    wait = min(wait, remaining)
+
+                rss = rss_bytes(self.process.pid)
+                if rss > WORKER_RSS_LIMIT_MB * 1e6:
+                    self._stop(f"RSS {rss / 1e6:.0f} MB above limit while running {name}", kill=True)
+                    raise RuntimeError(f"worker {self.group} exceeded {WORKER_RSS_LIMIT_MB:.0f} MB")
+
+                try:
+                    if not self.conn.poll(wait):
+                        continue
+                    msg = self.conn.recv()
+                except (EOFError, OSError):
+                    self._stop(f"connection lost while running {name}", kill=True)
+                    raise RuntimeError(f"worker {self.group} died while running {name}")
+
+                if msg[0] == 'points':
+                    influx.write_lines(msg[1])
+                elif msg[0] == 'confirm':
+                    self.conn.send(('confirmed', influx.write_lines_confirmed(msg[1])))
+                elif msg[0] == 'done':
+                    _, ok, error, cpu_seconds, rss = msg
+                    self._finish(name, cpu_seconds, rss)
+                    if not ok:
+                        raise RuntimeError(error)
+                    return
+
+    def _finish(self, name: str, cpu_seconds: float, rss: int) -> None:
+        self.runs += 1
+        self.cpu_seconds += cpu_seconds
+        self.rss_bytes = rss
+        WORKER_RUNS.inc(group=self.group)
+        WORKER_CPU.inc(cpu_seconds, group=self.group)
+        WORKER_RSS.set(rss, group=self.group)
+        logger.info("[worker] %s in %s: run %d, cpu %.2fs (total %.1fs), rss %.0f MB",
+                    name, self.group, self.runs, cpu_seconds, self.cpu_seconds, rss / 1e6)
+        if self.runs >= WORKER_MAX_RUNS:
+            self._stop(f"recycling after {self.runs} runs")
+        elif rss > WORKER_RECYCLE_RSS_MB * 1e6:
+            self._stop(f"recycling at {rss / 1e6:.0f} MB RSS")
+
+    def close(self) -> None:
+        """Stop the worker; one busy with a run is killed rather than waited for."""
+        if self._lock.acquire(blocking=False):
+            try:
+                self._stop("shutdown")
+            finally:
+                self._lock.release()
+            return
+        # run() holds the lock until the collector finishes or times out.
+        process = self.process
+        if process is not None:
+            logger.info("[worker] Killing worker %s (pid %d) during a run: shutdown", self.group, process.pid)
+            process.kill()
+
+
+_workers: Dict[str, Worker] = {}
+
+
+def workers() -> Dict[str, Worker]:
+    return dict(_workers)
+
+
+def proxy(collector: Collector, nice: int = 0) -> Callable[[], None]:
+    """Return a sync job that runs `collector` in its group's worker process."""
+    group = collector.group or collector.name
+    w = _workers.get(group)
+    if w is None:
+        w = _workers[group] = Worker(group, nice)
+    else:
+        w.nice = min(w.nice, nice)
+
+    def run() -> None:
+        w.run(collector.name, collector.timeout_seconds)
+    run.__name__ = collector.name
+    return run
+
+
+def shutdown() -> None:
+    for w in _workers.values():
+        w.close()
+
+
+def _worker_main(conn: Connection, group: str, nice: int) -> None:
+    """Entry point of a worker process: run collectors on request until told to stop."""
+    logging.basicConfig(level=logging.INFO,
+                        format='%(levelname)s %(message)s')
+    if nice:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+        except OSError as e:
+            logger.debug("[worker] Unable to renice worker %s: %s", group, e)
+    # Collectors write from their own threads (asyncio.to_thread, pools), and
+    # concurrent Connection.send() calls can interleave their bytes.
+    send_lock = threading.Lock()
+
+    def send(msg: tuple) -> None:
+        with send_lock:
+            conn.send(msg)
+
+    # A confirmed write waits for the parent's answer. Only the collector
+    # receives during a run, the loop below only between runs.
+    confirm_lock = threading.Lock()
+
+    def confirm(lines: List[str]) -> bool:
+        with confirm_lock:
+            send(('confirm', lines))
+            return conn.recv()[1]
+
+    influx.forward_to(lambda lines: send(('points', lines)), confirm)
+    # Async collectors keep state (e.g. aqualink's httpx client) bound to the
+    # loop, so one loop lives as long as the worker.
+    loop = asyncio.new_event_loop()
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            break
+        if msg[0] == 'stop':
+            break
+
+        _, name = msg
+        cpu_before = time.process_time()
+        ok, error = True, None
+        try:
+            func = collectors.load(collectors.get(name))
+            with capture_errors() as errors:
+                if inspect.iscoroutinefunction(func):
+                    loop.run_until_complete(func())
+                else:
+                    func()
+            if errors:
+                ok, error = False, describe_errors(errors)
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        send(('done', ok, error, time.process_time() - cpu_before, rss_bytes(os.getpid())))
+
+    loop.close()
+    conn.close()
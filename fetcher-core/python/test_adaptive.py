@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for adaptive polling: only successful runs that wrote points move the interval.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import schedule
+
+import adaptive
+import scheduler
+
+
+def collector_adaptive():
+    pass
+
+
+class AdaptiveTest(unittest.TestCase):
+    def setUp(self):
+        self.job = schedule.Scheduler().every(60).seconds.do(collector_adaptive)
+        adaptive.register(self.job, 30, 300)
+
+    def tearDown(self):
+        adaptive._jobs.pop('collector_adaptive', None)
+
+    def _after(self, status, points, changed):
+        state = scheduler.JobState(last_status=status, run_points=points, changed=changed)
+        adaptive._on_run('collector_adaptive', state)
+        return adaptive.intervals()['collector_adaptive']
+
+    def test_unchanged_values_slow_down(self):
+        self.assertEqual(self._after('ok', 3, False), 90)
+
+    def test_changed_values_speed_up(self):
+        self.assertEqual(self._after('ok', 3, True), 30)
+
+    def test_failed_run_keeps_interval(self):
+        self.assertEqual(self._after('error', 0, False), 60)
+
+    def test_run_without_points_keeps_interval(self):
+        self.assertEqual(self._after('ok', 0, False), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
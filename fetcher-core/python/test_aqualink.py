@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for aqualink's stored session: a device request the service rejects
+must drop the stored session instead of reusing it on every run.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import httpx
+
+import aqualink
+
+SERIAL = 'ABC123'
+
+
+class _Client:
+    """Stands in for a logged in AqualinkClient serving one i2d system."""
+
+    def __init__(self, response: httpx.Response):
+        self.system = aqualink.I2DSystem(self, {'serial_number': SERIAL, 'name': 'Pool'})
+        self.system._send_device_request = mock.AsyncMock(return_value=response)
+
+    async def get_systems(self):
+        return {SERIAL: self.system}
+
+
+class RejectedSessionTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (('aqualink_username', 'user@example.com'), ('aqualink_password', 'secret'),
+                            ('_reset_client', mock.AsyncMock())):
+            patcher = mock.patch.object(aqualink, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(aqualink.sessions, 'drop')
+        self.drop = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run(self, response: httpx.Response) -> None:
+        with mock.patch.object(aqualink, '_get_client', mock.AsyncMock(return_value=_Client(response))), \
+                mock.patch.object(aqualink.asyncio, 'sleep', mock.AsyncMock()), \
+                mock.patch.object(aqualink, 'write_influx') as write:
+            asyncio.run(aqualink.aqualink())
+        write.assert_not_called()
+
+    def test_unauthorized_drops_session(self):
+        self._run(httpx.Response(401, json={'message': 'Unauthorized'}))
+        self.drop.assert_called_once_with('aqualink', 'user@example.com')
+        aqualink._reset_client.assert_awaited_once()
+
+    def test_missing_alldata_drops_session(self):
+        self._run(httpx.Response(200, json={}))
+        self.drop.assert_called_with('aqualink', 'user@example.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for delta suppression: unchanged fields are dropped between heartbeats,
+which follow the cadence the series is polled at.
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import delta
+
+LINE = 'tapo_device,device_mac=aa device_on=true,power=3i'
+
+
+class SuppressTest(unittest.TestCase):
+    def setUp(self):
+        delta._last.clear()
+        self.now = 1000.0
+        patcher = mock.patch.object(delta.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _poll(self, line=LINE, every=300):
+        out = delta.suppress([line])
+        self.now += every
+        return out
+
+    def test_five_minute_cadence(self):
+        # Written in full every third poll, suppressed in between.
+        out = [self._poll() for _ in range(7)]
+        self.assertEqual(out, [[LINE], [], [], [LINE], [], [], [LINE]])
+
+    def test_one_minute_cadence(self):
+        out = [self._poll(every=60) for _ in range(4)]
+        self.assertEqual(out, [[LINE], [], [], [LINE]])
+
+    def test_changed_field_is_written(self):
+        self._poll()
+        changed = 'tapo_device,device_mac=aa device_on=true,power=5i'
+        self.assertEqual(self._poll(changed), ['tapo_device,device_mac=aa power=5i'])
+
+    def test_heartbeat_seconds_caps_slow_cadence(self):
+        out = [self._poll(every=600) for _ in range(3)]
+        self.assertEqual(out, [[LINE], [], [LINE]])
+
+    def test_timestamped_lines_are_not_suppressed(self):
+        line = 'energy_price,area=SE4 SEK_per_kWh=0.5 1700000000'
+        self.assertEqual([self._poll(line) for _ in range(3)], [[line]] * 3)
+
+    def test_forget_after_failed_write(self):
+        self._poll()
+        delta.forget([LINE + ' 1700000000'])
+        self.assertEqual(self._poll(), [LINE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Regression test for the influx write batcher: a batch that is not full must
+still be flushed INFLUX_BATCH_DELAY seconds after its first point, also when
+the writer thread was idle waiting on an empty queue.
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import influx
+
+
+class _Recorder:
+    """Stands in for an _Output, recording the batches the batcher sends."""
+
+    name = 'test'
+
+    def __init__(self):
+        self.sent = []
+        self.event = threading.Event()
+
+    def send(self, lines, reason):
+        self.sent.append((list(lines), reason, time.monotonic()))
+        self.event.set()
+
+
+class BatcherTest(unittest.TestCase):
+    def setUp(self):
+        self._delay = influx.INFLUX_BATCH_DELAY
+        influx.INFLUX_BATCH_DELAY = 0.2
+        self.output = _Recorder()
+        self.batcher = influx._Batcher(self.output)
+
+    def tearDown(self):
+        self.batcher.close(1)
+        influx.INFLUX_BATCH_DELAY = self._delay
+
+    def _put_and_wait(self, lines):
+        self.output.event.clear()
+        started = time.monotonic()
+        self.batcher.put(lines)
+        self.assertTrue(self.output.event.wait(2), "batch was not flushed")
+        return self.output.sent[-1][2] - started
+
+    def test_flushes_after_delay(self):
+        self.assertLess(self._put_and_wait(['m v=1i 1']), 1)
+        self.assertEqual(self.output.sent[-1][:2], (['m v=1i 1'], 'delay'))
+
+    def test_flushes_after_delay_once_idle(self):
+        # The first batch leaves the writer waiting on an empty queue; later
+        # batches used to wait for a full batch or close() instead.
+        for i in range(3):
+            self.assertLess(self._put_and_wait([f'm v={i}i {i}']), 1)
+            self.assertEqual(self.output.sent[-1][:2], ([f'm v={i}i {i}'], 'delay'))
+
+    def test_close_flushes_rest(self):
+        influx.INFLUX_BATCH_DELAY = 60
+        self.batcher.put(['m v=1i 1'])
+        self.batcher.close(1)
+        self.assertEqual([sent[:2] for sent in self.output.sent], [(['m v=1i 1'], 'closed')])
+
+
+if __name__ == '__main__':
+    unittest.main()
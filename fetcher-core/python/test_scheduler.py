@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Tests for how the scheduler records the outcome of a collector run.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import schedule
+
+import scheduler
+
+logger = logging.getLogger('test_scheduler')
+
+
+def _errors(name):
+    return scheduler.ERRORS._values.get(scheduler.ERRORS._key({'collector': name}), 0)
+
+
+class RunOutcomeTest(unittest.TestCase):
+    def _run(self, func, timeout_seconds=1.0):
+        scheduler._states.pop(func.__name__, None)
+        asyncio.run(scheduler.run_job(func, timeout_seconds))
+        return scheduler.job_state(func.__name__)
+
+    def test_ok(self):
+        def collector_ok():
+            pass
+        self.assertEqual(self._run(collector_ok).last_status, 'ok')
+
+    def test_deadline_is_a_timeout(self):
+        async def collector_slow():
+            await asyncio.sleep(5)
+        state = self._run(collector_slow, timeout_seconds=0.1)
+        self.assertEqual(state.last_status, 'timeout')
+        self.assertEqual(state.timeouts, 1)
+
+    def test_own_timeout_error_is_an_error(self):
+        def collector_socket_timeout():
+            raise TimeoutError("timed out")
+        state = self._run(collector_socket_timeout)
+        self.assertEqual(state.last_status, 'error')
+        self.assertEqual(state.timeouts, 0)
+        self.assertNotIn('collector_socket_timeout', scheduler._abandoned)
+
+    def test_own_timeout_error_in_coroutine_is_an_error(self):
+        async def collector_async_timeout():
+            raise TimeoutError("timed out")
+        self.assertEqual(self._run(collector_async_timeout).last_status, 'error')
+
+    def test_job_timeout_is_a_timeout(self):
+        def collector_worker_killed():
+            raise scheduler.JobTimeout("collector_worker_killed timed out in worker")
+        self.assertEqual(self._run(collector_worker_killed).last_status, 'timeout')
+
+
+class LoggedErrorTest(unittest.TestCase):
+    """Collectors that catch, log and swallow their errors must still fail the run."""
+
+    def _run(self, func):
+        scheduler._states.pop(func.__name__, None)
+        errors_before = _errors(func.__name__)
+        asyncio.run(scheduler.run_job(func, 1.0))
+        return scheduler.job_state(func.__name__), _errors(func.__name__) - errors_before
+
+    def test_swallowed_error_in_thread(self):
+        def collector_refused():
+            try:
+                raise ConnectionRefusedError("Connection refused")
+            except OSError as e:
+                logger.error(f"[test] Failed to fetch zones: {e}")
+        state, errors = self._run(collector_refused)
+        self.assertEqual(state.last_status, 'error')
+        self.assertIsNone(state.last_success)
+        self.assertEqual(errors, 1)
+
+    def test_swallowed_error_in_coroutine_and_its_threads(self):
+        async def collector_async_refused():
+            await asyncio.to_thread(logger.exception, "[test] Failed to execute module")
+        state, errors = self._run(collector_async_refused)
+        self.assertEqual(state.last_status, 'error')
+        self.assertEqual(errors, 1)
+
+    def test_warnings_do_not_fail_the_run(self):
+        def collector_warns():
+            logger.warning("[test] One device did not answer")
+        state, errors = self._run(collector_warns)
+        self.assertEqual(state.last_status, 'ok')
+        self.assertIsNotNone(state.last_success)
+        self.assertEqual(errors, 0)
+
+    def test_errors_outside_runs_are_ignored(self):
+        with scheduler.capture_errors() as errors:
+            pass
+        logger.error("[test] Not part of a run")
+        self.assertEqual(errors, [])
+
+
+class ResumeTest(unittest.TestCase):
+    def test_swallowed_failure_is_resumed_after_restart(self):
+        def collector_resumed():
+            logger.error("[test] Failed to fetch")
+        scheduler._states.pop('collector_resumed', None)
+        asyncio.run(scheduler.run_job(collector_resumed, 1.0))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'scheduler.json')
+            scheduler.save_state(path)
+            scheduler._states.pop('collector_resumed')
+            scheduler.load_state(path)
+        self.assertEqual(scheduler.job_state('collector_resumed').last_status, 'error')
+
+        j = schedule.Scheduler().every(1).hours.do(collector_resumed)
+        self.assertTrue(scheduler.resume(j))
+
+    def test_recent_success_is_not_resumed(self):
+        def collector_recent():
+            pass
+        scheduler._states.pop('collector_recent', None)
+        asyncio.run(scheduler.run_job(collector_recent, 1.0))
+        j = schedule.Scheduler().every(1).hours.do(collector_recent)
+        self.assertFalse(scheduler.resume(j))
+
+
+if __name__ == '__main__':
+    unittest.main()
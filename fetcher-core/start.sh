@@ -18,16 +18,11 @@ if [ -n "$1" ]; then
         exit 0
     fi
 
-    python3 ./python/src/main.py "$@"
-    exit 0
+    exec python3 ./python/src/main.py "$@"
 fi
 
 HOSTNAME=0.0.0.0 PORT=${WEB_UI_PORT:-8080} node ./webui/server.js &
 
-python3 ./python/src/main.py &
-
-# Wait for all background processes to finish
-wait
-
-# Exit with status 0 after all processes finish
-exit 0
+# Replace the shell, so SIGTERM from docker stop reaches python and it can
+# flush queued points before exiting.
+exec python3 ./python/src/main.py